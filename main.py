@@ -1,9 +1,15 @@
 import sys
 import os
 import json
+import hashlib
+from collections import OrderedDict
 from svg2aff import (
-    svgPath2Aff,
-    svgPath2Lines,
+    spliceArcsIntoAff,
+    lines2AffChunks,
+    writeChunks,
+    svgPath2LinesWithOptions,
+    commandBuffer,
+    convertOptions,
     point
 )
 from PyQt5.QtWidgets import (
@@ -30,6 +36,7 @@ from math import (
     ceil
 )
 from PyQt5.QtCore import QFileInfo, Qt
+import numpy as np
 from qt_material import apply_stylesheet
 from BlurWindow.blurWindow import GlobalBlur
 import sys
@@ -155,8 +162,8 @@ I18N_TEXTS = {
     },
     'svgRawToolTip':
     {
-        _LANG_EN: 'Please use https://yqnn.github.io/svg-path-editor/ to format your SVG Path\r\nPlease do not use Minify output', 
-        _LANG_ZH_HANS: '使用时请到 https://yqnn.github.io/svg-path-editor/ 格式化你的 SVG 路径\r\n请不要使用 Minify output 输出'
+        _LANG_EN: 'Paste the "d" attribute of your SVG Path\r\nMinified path data is supported', 
+        _LANG_ZH_HANS: '粘贴 SVG 路径的 "d" 属性\r\n支持 Minify 后的路径数据'
     },
     'scaleFirstToolTip':
     {
@@ -188,6 +195,91 @@ I18N_TEXTS = {
         _LANG_EN: 'Curve Count is too large',
         _LANG_ZH_HANS: '曲线数量过大'
     },
+    'curveTolerance':
+    {
+        _LANG_EN: 'Curve Flatness Tolerance',
+        _LANG_ZH_HANS: '曲线平直容差'
+    },
+    'curveToleranceToolTip':
+    {
+        _LANG_EN: 'When greater than 0, curves are split adaptively so that no line deviates from the curve by more than this distance (result units)\r\nThe curve split count / interval is ignored in this mode',
+        _LANG_ZH_HANS: '大于 0 时将自适应分割曲线, 使每条线段与曲线的偏差不超过此距离 (结果单位)\r\n此模式下将忽略曲线分割数量 / 间隔'
+    },
+    'invalidCurveTolerance':
+    {
+        _LANG_EN: 'Curve Flatness Tolerance is too small',
+        _LANG_ZH_HANS: '曲线平直容差过小'
+    },
+    'removeOverlaps':
+    {
+        _LANG_EN: 'Remove Overlapping Lines',
+        _LANG_ZH_HANS: '移除重叠线段'
+    },
+    'removeOverlapsToolTip':
+    {
+        _LANG_EN: 'When enabled, reversed duplicate lines (e.g. edges shared by adjacent shapes) are removed and overlapping lines on the same straight line are merged',
+        _LANG_ZH_HANS: '勾选后将移除反向重复的线段 (例如相邻图形的公共边), 并合并同一直线上相互重叠的线段'
+    },
+    'mergeAngle':
+    {
+        _LANG_EN: 'Merge Angle Tolerance',
+        _LANG_ZH_HANS: '合并角度容差'
+    },
+    'mergeAngleToolTip':
+    {
+        _LANG_EN: 'When greater than 0, consecutive lines whose directions differ by no more than this angle (degrees) are merged into one line',
+        _LANG_ZH_HANS: '大于 0 时将方向相差不超过此角度 (度) 的连续线段合并为一条线段'
+    },
+    'invalidMergeAngle':
+    {
+        _LANG_EN: 'Merge Angle Tolerance must be between 0 and 90',
+        _LANG_ZH_HANS: '合并角度容差必须在 0 到 90 之间'
+    },
+    'simplifyTolerance':
+    {
+        _LANG_EN: 'Simplify Tolerance',
+        _LANG_ZH_HANS: '简化容差'
+    },
+    'simplifyToleranceToolTip':
+    {
+        _LANG_EN: 'When greater than 0, every continuous polyline is simplified (Ramer-Douglas-Peucker) so that it deviates from the original by no more than this distance (result units)',
+        _LANG_ZH_HANS: '大于 0 时将简化每条连续折线 (Ramer-Douglas-Peucker), 简化后与原折线的偏差不超过此距离 (结果单位)'
+    },
+    'invalidSimplifyTolerance':
+    {
+        _LANG_EN: 'Simplify Tolerance can not be negative',
+        _LANG_ZH_HANS: '简化容差不能为负数'
+    },
+    'maxArcCount':
+    {
+        _LANG_EN: 'Max Arc Count',
+        _LANG_ZH_HANS: '最大 Arc 数量'
+    },
+    'maxArcCountToolTip':
+    {
+        _LANG_EN: 'When greater than 0, the smallest simplify tolerance (not less than Simplify Tolerance) that keeps the result within this arc count is searched automatically',
+        _LANG_ZH_HANS: '大于 0 时将自动查找使结果不超过此 Arc 数量的最小简化容差 (不小于简化容差)'
+    },
+    'invalidMaxArcCount':
+    {
+        _LANG_EN: 'Max Arc Count can not be negative',
+        _LANG_ZH_HANS: '最大 Arc 数量不能为负数'
+    },
+    'arcCountResult':
+    {
+        _LANG_EN: 'Arc count: {} / {}\r\nSimplify tolerance: {:.6g}\r\nMax error: {:.6g}',
+        _LANG_ZH_HANS: 'Arc 数量: {} / {}\r\n简化容差: {:.6g}\r\n最大误差: {:.6g}'
+    },
+    'transform':
+    {
+        _LANG_EN: 'SVG Transform',
+        _LANG_ZH_HANS: 'SVG 变换'
+    },
+    'transformToolTip':
+    {
+        _LANG_EN: 'The "transform" attribute of your SVG Path (e.g. translate(10 20) rotate(45)), applied before offset and scale\r\nSupports matrix, translate, scale, rotate, skewX and skewY',
+        _LANG_ZH_HANS: 'SVG 路径的 "transform" 属性 (例如 translate(10 20) rotate(45)), 在偏移与缩放之前应用\r\n支持 matrix, translate, scale, rotate, skewX 与 skewY'
+    },
     'format': {
         _LANG_EN: 'Format',
         _LANG_ZH_HANS: '格式'
@@ -204,6 +296,30 @@ I18N_TEXTS = {
         _LANG_EN: 'When enabled, the minimum/maximum Y of the shape and the start/end Y of each segment will be interpolated between the start and end time to determine Z position',
         _LANG_ZH_HANS: '勾选后将使用图形的最小 / 最大 Y 和线段的起始 / 结束 Y 位置在开始 / 结束时间之间进行插值'
     },
+    'spliceIntoChart': {
+        _LANG_EN: 'Merge Into Chart',
+        _LANG_ZH_HANS: '合并到谱面'
+    },
+    'spliceIntoChartToolTip': {
+        _LANG_EN: 'When enabled, the generated arcs are merged into an existing chart by time, the result is saved where you choose (the chart itself by default)\r\nArcs that already exist in the chart are skipped',
+        _LANG_ZH_HANS: '勾选后生成的 Arc 将按时间合并到已有谱面中, 结果保存到选择的位置 (默认为谱面本身)\r\n谱面中已存在的 Arc 会被跳过'
+    },
+    'wrapTimingGroup': {
+        _LANG_EN: 'Wrap In Timing Group',
+        _LANG_ZH_HANS: '包裹在 Timing Group 中'
+    },
+    'wrapTimingGroupToolTip': {
+        _LANG_EN: 'When merging into a chart, put the arcs into a new timinggroup at the end of the chart that uses its first timing',
+        _LANG_ZH_HANS: '合并到谱面时, 将 Arc 放入谱面末尾的新 timinggroup 中, 使用谱面的第一个 timing'
+    },
+    'openChart': {
+        _LANG_EN: 'Open Chart',
+        _LANG_ZH_HANS: '打开谱面'
+    },
+    'spliceResult': {
+        _LANG_EN: '{} arcs merged into the chart',
+        _LANG_ZH_HANS: '已将 {} 个 Arc 合并到谱面'
+    },
     'info': {
         _LANG_EN: 'Info',
         _LANG_ZH_HANS: '信息'
@@ -222,6 +338,12 @@ DESIGN_SIZE_Y_SCALE = Y_SCALE + 0.5
 GRID_X_LIMIT = 150
 GRID_Y_LIMIT = GRID_X_LIMIT // Y_SCALE
 
+# Entries kept by each level of the conversion cache
+CONVERSION_CACHE_SIZE = 8
+# Longest aff text kept by the conversion cache, longer ones are formatted
+# again from the cached lines
+CONVERSION_CACHE_TEXT_SIZE = 4 * 1024 * 1024
+
 def calculateScreenScale():
     global SCREEN_SCALE
     screenRect = QApplication.primaryScreen().geometry()
@@ -265,6 +387,112 @@ def applyIcon(window):
     fileinfo = QFileInfo(__file__).absolutePath()
     window.setWindowIcon(QIcon(fileinfo + '/Icon.ico'))
 
+class generateConfig:
+    # Values of the main window, the conversion parameters are kept in options
+    def __init__(self, svgRaw, tick, endTick, offsetEnd, format_, useZPosMode, options):
+        self.svgRaw = svgRaw
+        self.tick = tick
+        self.endTick = endTick
+        self.offsetEnd = offsetEnd
+        self.format_ = format_
+        self.useZPosMode = useZPosMode
+        self.options = options
+
+    @property
+    def pathKey(self):
+        return hashlib.sha1(self.svgRaw.encode('utf-8')).hexdigest()
+
+    @property
+    def linesKey(self):
+        return self.pathKey, self.options.key()
+
+    @property
+    def affKey(self):
+        return (
+            self.linesKey,
+            self.tick,
+            self.endTick,
+            self.offsetEnd.x,
+            self.offsetEnd.y,
+            self.useZPosMode
+        )
+
+class conversionCache:
+    # Results of the last conversions, the parsed commands are keyed by the
+    # hash of the path, the lines also by the conversion options and short aff
+    # texts also by the time parameters, each level drops its least recently
+    # used entry when full
+    def __init__(self, size=CONVERSION_CACHE_SIZE):
+        self.size = size
+        self.commandCache = OrderedDict()
+        self.lineCache = OrderedDict()
+        self.affCache = OrderedDict()
+
+    def __get(self, cache, key, create):
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        value = create()
+        cache[key] = value
+        if len(cache) > self.size:
+            cache.popitem(last=False)
+        return value
+
+    def commands(self, config):
+        return self.__get(
+            self.commandCache,
+            config.pathKey,
+            lambda: commandBuffer.fromRaw(config.svgRaw)
+        )
+
+    def lines(self, config, stats=None):
+        # Returns the lines of svgPath2Lines for a generateConfig
+        def create():
+            lineStats = {}
+            lines = svgPath2LinesWithOptions(self.commands(config), config.options, lineStats)
+            return lines, lineStats
+
+        lines, lineStats = self.__get(self.lineCache, config.linesKey, create)
+        if stats is not None:
+            stats.update(lineStats)
+        return lines
+
+    def affChunks(self, config, stats=None):
+        # Returns the text of svgPath2Aff for a generateConfig as chunks of
+        # lines to join by new lines, the cached text if there is one,
+        # otherwise formatted chunk by chunk from the cached lines
+        key = config.affKey
+        if key in self.affCache:
+            self.affCache.move_to_end(key)
+            text, affStats = self.affCache[key]
+            if stats is not None:
+                stats.update(affStats)
+            return [text]
+
+        return lines2AffChunks(
+            self.lines(config, stats),
+            config.tick,
+            config.endTick,
+            config.options.offset,
+            config.offsetEnd,
+            config.format_,
+            config.useZPosMode
+        )
+
+    def aff(self, config, stats=None):
+        # Returns the text of svgPath2Aff for a generateConfig, only texts up
+        # to CONVERSION_CACHE_TEXT_SIZE are cached
+        affStats = {}
+        text = '\n'.join(self.affChunks(config, affStats))
+        if stats is not None:
+            stats.update(affStats)
+        key = config.affKey
+        if key not in self.affCache and len(text) <= CONVERSION_CACHE_TEXT_SIZE:
+            self.affCache[key] = text, affStats
+            if len(self.affCache) > self.size:
+                self.affCache.popitem(last=False)
+        return text
+
 class previewWindow(QWidget):
     def __init__(self, lines):
         super().__init__()
@@ -277,19 +505,7 @@ class previewWindow(QWidget):
         self.setFixedSize(*fixScales(800, 800))
 
         self.lines = lines
-        self.mnw = float('inf')
-        self.mnh = float('inf')
-        self.mxw = -float('inf')
-        self.mxh = -float('inf')
-        for line in lines:
-            p0 = line[0]
-            p1 = line[1]
-            # min
-            self.mnw = min(self.mnw, p0.x, p1.x)
-            self.mnh = min(self.mnh, p0.y, p1.y)
-            # max
-            self.mxw = max(self.mxw, p0.x, p1.x)
-            self.mxh = max(self.mxh, p0.y, p1.y)
+        self.mnw, self.mnh, self.mxw, self.mxh = lines.bounds
 
         mnw = self.mnw
         mnh = self.mnh
@@ -309,20 +525,25 @@ class previewWindow(QWidget):
         self.designSize = designSize
         self.border = border
         self.scale = scale
+        self.screenLines = self.transLines(lines.data)
+
+    def transLines(self, data):
+        # Same as transPoint on both points of all (n, 4) lines
+        x = (data[:, 0::2] - self.mnw) * self.scale
+        y = self.designSize * DESIGN_SIZE_Y_SCALE - (data[:, 1::2] - self.mnh) * self.scale * Y_SCALE
+        x = ((x + self.border) * SCREEN_SCALE).astype(np.int64)
+        y = ((y + self.border) * SCREEN_SCALE).astype(np.int64)
+        return np.stack((x[:, 0], y[:, 0], x[:, 1], y[:, 1]), axis=1).tolist()
 
     def transPoint(self, p):
-        _p = (p - point(self.mnw, self.mnh)) * self.scale
-        _p *= point(1, Y_SCALE)
-        _p = point(_p.x, (self.designSize * DESIGN_SIZE_Y_SCALE - _p.y))
-        return ((_p + point(self.border)) * SCREEN_SCALE).toIntPoint()
+        x = (p.x - self.mnw) * self.scale
+        y = self.designSize * DESIGN_SIZE_Y_SCALE - (p.y - self.mnh) * self.scale * Y_SCALE
+        return point(int((x + self.border) * SCREEN_SCALE), int((y + self.border) * SCREEN_SCALE))
     
     def resetPoint(self, p):
-        _p = (p / SCREEN_SCALE - point(self.border))
-        _p = point(_p.x, (self.designSize * DESIGN_SIZE_Y_SCALE - _p.y))
-        _p /= point(1, Y_SCALE)
-        _p /= self.scale
-        _p += point(self.mnw, self.mnh)
-        return _p
+        x = p.x / SCREEN_SCALE - self.border
+        y = self.designSize * DESIGN_SIZE_Y_SCALE - (p.y / SCREEN_SCALE - self.border)
+        return point(x / self.scale + self.mnw, y / Y_SCALE / self.scale + self.mnh)
 
     def drawText(self, painter, pen, x, y, text, shadow=True, color=QColor(255, 255, 255, 255)):
 
@@ -486,11 +707,8 @@ class previewWindow(QWidget):
         setPenColor(0x91, 0x78, 0xaa, 200)
         setPenWidth(.02 * self.scale, 2)
         
-        for line in self.lines:
-            p0 = self.transPoint(line[0])
-            p1 = self.transPoint(line[1])
-            
-            painter.drawLine(p0.x, p0.y, p1.x, p1.y)
+        for x0, y0, x1, y1 in self.screenLines:
+            painter.drawLine(x0, y0, x1, y1)
 
         # draw info
 
@@ -533,6 +751,8 @@ class mainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
 
+        self.cache = conversionCache()
+
         # screenRect = QApplication.desktop().screenGeometry()
 
         calculateScreenScale()
@@ -547,8 +767,8 @@ class mainWindow(QMainWindow):
         applyIcon(self)
 
         self.setWindowTitle(I18N_TEXTS["title"][LANG])
-        self.setGeometry(*fixScales(100, 100, 800, 950))
-        self.setFixedSize(*fixScales(800, 950))
+        self.setGeometry(*fixScales(100, 100, 800, 1350))
+        self.setFixedSize(*fixScales(800, 1350))
 
         # create components
 
@@ -597,6 +817,13 @@ class mainWindow(QMainWindow):
 
         height += 50
 
+        self.transformLabel = self.__createLabel(
+            I18N_TEXTS["transform"][LANG], 50, height, I18N_TEXTS["transformToolTip"][LANG])
+        self.transformEdit = self.__createLineEdit(200 + widthOffset, height)
+        self.transformEdit.resize(*fixScales(550 - widthOffset, 35))
+
+        height += 50
+
         self.scaleFirstLabel = self.__createLabel(
             I18N_TEXTS["scaleFirst"][LANG], 50, height, I18N_TEXTS["scaleFirstToolTip"][LANG])
         self.scaleFirstCheckBox = self.__createCheckBox(200 + widthOffset, height)
@@ -625,6 +852,36 @@ class mainWindow(QMainWindow):
 
         height += 50
 
+        self.curveToleranceLabel = self.__createLabel(
+            I18N_TEXTS["curveTolerance"][LANG], 50, height, I18N_TEXTS["curveToleranceToolTip"][LANG])
+        self.curveToleranceEdit = self.__createLineEdit(200 + widthOffset, height)
+
+        height += 50
+
+        self.removeOverlapsLabel = self.__createLabel(
+            I18N_TEXTS["removeOverlaps"][LANG], 50, height, I18N_TEXTS["removeOverlapsToolTip"][LANG])
+        self.removeOverlapsCheckBox = self.__createCheckBox(200 + widthOffset, height)
+
+        height += 50
+
+        self.mergeAngleLabel = self.__createLabel(
+            I18N_TEXTS["mergeAngle"][LANG], 50, height, I18N_TEXTS["mergeAngleToolTip"][LANG])
+        self.mergeAngleEdit = self.__createLineEdit(200 + widthOffset, height)
+
+        height += 50
+
+        self.simplifyToleranceLabel = self.__createLabel(
+            I18N_TEXTS["simplifyTolerance"][LANG], 50, height, I18N_TEXTS["simplifyToleranceToolTip"][LANG])
+        self.simplifyToleranceEdit = self.__createLineEdit(200 + widthOffset, height)
+
+        height += 50
+
+        self.maxArcCountLabel = self.__createLabel(
+            I18N_TEXTS["maxArcCount"][LANG], 50, height, I18N_TEXTS["maxArcCountToolTip"][LANG])
+        self.maxArcCountEdit = self.__createLineEdit(200 + widthOffset, height)
+
+        height += 50
+
         self.formatLabel = self.__createLabel(I18N_TEXTS["format"][LANG], 50, height)
         self.formatEdit = self.__createLineEdit(200 + widthOffset, height)
 
@@ -634,6 +891,18 @@ class mainWindow(QMainWindow):
             I18N_TEXTS["useZPosMode"][LANG], 50, height, I18N_TEXTS["useZPosModeToolTip"][LANG])
         self.useZPosModeCheckBox = self.__createCheckBox(200 + widthOffset, height)
 
+        height += 50
+
+        self.spliceIntoChartLabel = self.__createLabel(
+            I18N_TEXTS["spliceIntoChart"][LANG], 50, height, I18N_TEXTS["spliceIntoChartToolTip"][LANG])
+        self.spliceIntoChartCheckBox = self.__createCheckBox(200 + widthOffset, height)
+
+        height += 50
+
+        self.wrapTimingGroupLabel = self.__createLabel(
+            I18N_TEXTS["wrapTimingGroup"][LANG], 50, height, I18N_TEXTS["wrapTimingGroupToolTip"][LANG])
+        self.wrapTimingGroupCheckBox = self.__createCheckBox(200 + widthOffset, height)
+
         height += 70
 
         self.generateButton = self.__createButton(
@@ -723,6 +992,11 @@ class mainWindow(QMainWindow):
         self.scaleFirstCheckBox.setChecked(True)
         self.curveCountEdit.setText('7')
         self.curveIntervalEdit.setText('0.1')
+        self.curveToleranceEdit.setText('0')
+        self.mergeAngleEdit.setText('0')
+        self.simplifyToleranceEdit.setText('0')
+        self.maxArcCountEdit.setText('0')
+        self.transformEdit.setText('')
         self.formatEdit.setText('f2')
 
     def messageBox(self, funcNameOrContent, exc):
@@ -742,6 +1016,17 @@ class mainWindow(QMainWindow):
             exc.__str__()
         )
 
+    def showArcCountResult(self, stats, maxArcCount):
+        self.messageBox(
+            I18N_TEXTS['arcCountResult'][LANG].format(
+                stats['arcCount'],
+                maxArcCount,
+                stats['simplifyTolerance'],
+                stats['maxError']
+            ),
+            None
+        )
+
     @staticmethod
     def __tryParseInt(s, n):
         try:
@@ -817,10 +1102,17 @@ class mainWindow(QMainWindow):
             self.curveCountLabel.text()
         )
         autoCurveCount = self.autoCurveCountCheckBox.isChecked()
+        curveTolerance = self.__tryParseFloat(
+            self.curveToleranceEdit.text(),
+            self.curveToleranceLabel.text()
+        )
         format_ = self.formatEdit.text().strip()
         if format_ == '' or format_[0].lower() != 'f':
             raise ValueError(I18N_TEXTS["invalidFormat"][LANG])
-        if not autoCurveCount:
+        if curveTolerance > 0:
+            if curveTolerance < 0.001:
+                raise ValueError(I18N_TEXTS['invalidCurveTolerance'][LANG])
+        elif not autoCurveCount:
             if curveUseInterval:
                 if curveInterval < 0.01:
                     raise ValueError(I18N_TEXTS['invalidCurveInterval'][LANG])
@@ -828,6 +1120,26 @@ class mainWindow(QMainWindow):
                 if curveCount > 128:
                     raise OverflowError(I18N_TEXTS['invalidCurveCount'][LANG])
         useZPosMode = self.useZPosModeCheckBox.isChecked()
+        removeOverlaps = self.removeOverlapsCheckBox.isChecked()
+        mergeAngle = self.__tryParseFloat(
+            self.mergeAngleEdit.text(),
+            self.mergeAngleLabel.text()
+        )
+        if not 0 <= mergeAngle < 90:
+            raise ValueError(I18N_TEXTS['invalidMergeAngle'][LANG])
+        simplifyTolerance = self.__tryParseFloat(
+            self.simplifyToleranceEdit.text(),
+            self.simplifyToleranceLabel.text()
+        )
+        if simplifyTolerance < 0:
+            raise ValueError(I18N_TEXTS['invalidSimplifyTolerance'][LANG])
+        maxArcCount = self.__tryParseInt(
+            self.maxArcCountEdit.text(),
+            self.maxArcCountLabel.text()
+        )
+        if maxArcCount < 0:
+            raise ValueError(I18N_TEXTS['invalidMaxArcCount'][LANG])
+        transform = self.transformEdit.text().strip()
         if dic != None:
             dic['svgRaw'] = svgRaw
             dic['tick'] = tick
@@ -842,20 +1154,38 @@ class mainWindow(QMainWindow):
             dic['autoCurveCount'] = autoCurveCount
             dic['format'] = format_
             dic['useZPosMode'] = useZPosMode
-        return (
-            svgRaw,
-            tick,
-            endTick,
+            dic['curveTolerance'] = curveTolerance
+            dic['removeOverlaps'] = removeOverlaps
+            dic['mergeAngle'] = mergeAngle
+            dic['simplifyTolerance'] = simplifyTolerance
+            dic['maxArcCount'] = maxArcCount
+            dic['transform'] = transform
+            dic['spliceIntoChart'] = self.spliceIntoChartCheckBox.isChecked()
+            dic['wrapTimingGroup'] = self.wrapTimingGroupCheckBox.isChecked()
+        options = convertOptions(
             offset,
-            deltaOffsetEnd,
             scale,
             scaleFirst,
             curveCount,
             curveInterval,
             curveUseInterval,
             autoCurveCount,
+            int(format_[1:]),
+            curveTolerance,
+            removeOverlaps,
+            mergeAngle,
+            simplifyTolerance,
+            maxArcCount,
+            transform
+        )
+        return generateConfig(
+            svgRaw,
+            tick,
+            endTick,
+            deltaOffsetEnd,
             format_,
-            useZPosMode
+            useZPosMode,
+            options
         )
     
     def exportConfig(self):
@@ -888,6 +1218,14 @@ class mainWindow(QMainWindow):
                 self.autoCurveCountCheckBox.setChecked(dic['autoCurveCount'])
                 self.formatEdit.setText(dic['format'])
                 self.useZPosModeCheckBox.setChecked(dic['useZPosMode'])
+                self.curveToleranceEdit.setText(str(dic['curveTolerance']))
+                self.removeOverlapsCheckBox.setChecked(dic['removeOverlaps'])
+                self.mergeAngleEdit.setText(str(dic['mergeAngle']))
+                self.simplifyToleranceEdit.setText(str(dic['simplifyTolerance']))
+                self.maxArcCountEdit.setText(str(dic['maxArcCount']))
+                self.transformEdit.setText(dic['transform'])
+                self.spliceIntoChartCheckBox.setChecked(dic['spliceIntoChart'])
+                self.wrapTimingGroupCheckBox.setChecked(dic['wrapTimingGroup'])
             except:
                 return
             
@@ -898,9 +1236,12 @@ class mainWindow(QMainWindow):
     def generate(self):
         try:
             
-            affRaw = svgPath2Aff(
-                *self.__parseConfig()
-            )
+            config = self.__parseConfig()
+            stats = {}
+
+            if self.spliceIntoChartCheckBox.isChecked():
+                self.spliceIntoChart(config, stats)
+                return
 
             # save aff file
 
@@ -916,17 +1257,54 @@ class mainWindow(QMainWindow):
             if filePath:
                 outputPath = filePath
                 with open(outputPath, 'w') as f:
-                    f.write(affRaw)
+                    writeChunks(f, self.cache.affChunks(config, stats))
+                if config.options.maxArcCount > 0:
+                    self.showArcCountResult(stats, config.options.maxArcCount)
 
         except Exception as ex:
             self.messageBox('mainWindow.generate', ex)
             return
         
+    def spliceIntoChart(self, config, stats):
+        options = QFileDialog.Options()
+        filePath, _ = QFileDialog.getOpenFileName(
+            self,
+            I18N_TEXTS["openChart"][LANG],
+            "",
+            I18N_TEXTS["fileFilter"][LANG],
+            options=options
+        )
+
+        if not filePath:
+            return
+
+        # The dialog asks before replacing an existing file
+        outputPath, _ = QFileDialog.getSaveFileName(
+            self,
+            I18N_TEXTS["saveAs"][LANG],
+            filePath,
+            I18N_TEXTS["fileFilter"][LANG],
+            options=options
+        )
+
+        if outputPath:
+            count = spliceArcsIntoAff(
+                filePath,
+                (
+                    line
+                    for text in self.cache.affChunks(config, stats)
+                    for line in text.split('\n')
+                ),
+                self.wrapTimingGroupCheckBox.isChecked(),
+                outputPath
+            )
+            if config.options.maxArcCount > 0:
+                self.showArcCountResult(stats, config.options.maxArcCount)
+            self.messageBox(I18N_TEXTS['spliceResult'][LANG].format(count), None)
+
     def openAffPreview(self):
         try:
-            affRaw = svgPath2Aff(
-                *self.__parseConfig()
-            )
+            affRaw = self.cache.aff(self.__parseConfig())
             self.previewAffWin = previewAffWindow(affRaw)
             self.previewAffWin.setStyleSheet(self.styleSheet())
             self.previewAffWin.show()
@@ -937,36 +1315,15 @@ class mainWindow(QMainWindow):
         
     def openPreview(self):
         try:
-            (
-                svgRaw,
-                _,
-                _,
-                offset,
-                _,
-                scale,
-                scaleFirst,
-                curveCount,
-                curveInterval,
-                curveUseInterval,
-                autoCurveCount,
-                format_,
-                _
-            ) = self.__parseConfig()
-            # self.messageBox(config[-1], None)
-            ndigits = int(format_[1:])
-            lines = svgPath2Lines(
-                svgRaw,
-                offset,
-                scale,
-                scaleFirst,
-                curveCount,
-                curveInterval,
-                curveUseInterval,
-                autoCurveCount,
-                ndigits
-            )
+            config = self.__parseConfig()
+            maxArcCount = config.options.maxArcCount
+            # self.messageBox(config.options.transform, None)
+            stats = {}
+            lines = self.cache.lines(config, stats)
             self.previewWin = previewWindow(lines)
             self.previewWin.show()
+            if maxArcCount > 0:
+                self.showArcCountResult(stats, maxArcCount)
 
         except Exception as ex:
             self.messageBox('mainWindow.openPreview', ex)
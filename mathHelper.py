@@ -5,58 +5,355 @@ from numpy import (
     cos as np_cos,
     pi as np_pi
 )
-from scipy.integrate import quad
+from math import comb
+from functools import lru_cache
+import numpy as np
+
+_BASIS_CACHE_SIZE = 512
+_GAUSS_LEGENDRE_ORDER = 16
+_LENGTH_TOLERANCE = 1e-9
+_LENGTH_MAX_DEPTH = 12
+_FLATTEN_MAX_DEPTH = 10
+_FLATTEN_MAX_SEGMENTS = 1 << _FLATTEN_MAX_DEPTH
+_CUMSUM_SHORT_RUN = 16
 
 # Generated by Codeium
 
-def cubic_bezier_length(p0, p1, p2, p3):
-    def integrand(t):
-        dxdt = 3*(1-t)**2 * (p1[0] - p0[0]) + 6*(1-t)*t * (p2[0] - p1[0]) + 3*t**2 * (p3[0] - p2[0])
-        dydt = 3*(1-t)**2 * (p1[1] - p0[1]) + 6*(1-t)*t * (p2[1] - p1[1]) + 3*t**2 * (p3[1] - p2[1])
-        return np_sqrt(dxdt**2 + dydt**2)
+def bezier_t(count):
+    # Uniform sample parameters i / (count - 1)
+    if count <= 1:
+        return np.zeros(count)
+    return np.arange(count) / (count - 1.)
 
-    L, _ = quad(integrand, 0, 1)
-    return L
+def bernstein_basis(degree, t):
+    # (len(t), degree + 1) matrix, row i holds the Bernstein polynomials at t[i]
+    t = np.asarray(t, dtype=np.float64)[:, None]
+    k = np.arange(degree + 1)
+    coefs = np.array([comb(degree, i) for i in range(degree + 1)], dtype=np.float64)
+    return coefs * (1 - t) ** (degree - k) * t ** k
 
-def quad_bezier_length(p0, p1, p2):
-    def integrand(t):
-        dxdt = 2*(1-t) * (p1[0] - p0[0]) + 2*t * (p2[0] - p1[0])
-        dydt = 2*(1-t) * (p1[1] - p0[1]) + 2*t * (p2[1] - p1[1])
-        return np_sqrt(dxdt**2 + dydt**2)
+@lru_cache(maxsize=_BASIS_CACHE_SIZE)
+def cached_bezier_t(count):
+    # Shared between calls, must not be modified
+    t = bezier_t(count)
+    t.setflags(write=False)
+    return t
+
+@lru_cache(maxsize=_BASIS_CACHE_SIZE)
+def cached_bernstein_basis(degree, count):
+    # Shared between calls, must not be modified
+    basis = bernstein_basis(degree, cached_bezier_t(count))
+    basis.setflags(write=False)
+    return basis
+
+def bezier_points(ctrl, basis):
+    # ctrl: (degree + 1, 2) control points of one curve or (n, degree + 1, 2) of n curves
+    return basis @ ctrl
+
+@lru_cache(maxsize=8)
+def power_basis_matrix(degree):
+    # M[j, k] is the t^j coefficient of the k-th Bernstein polynomial
+    m = np.zeros((degree + 1, degree + 1))
+    for k in range(degree + 1):
+        for j in range(k, degree + 1):
+            m[j, k] = comb(degree, k) * comb(degree - k, j - k) * (-1) ** (j - k)
+    m.setflags(write=False)
+    return m
+
+def bezier_poly_coefs(ctrl):
+    # ctrl: (n, degree + 1, 2), returns (n, degree + 1, 2) coefficients of t^0 .. t^degree
+    return power_basis_matrix(ctrl.shape[1] - 1) @ ctrl
+
+@lru_cache(maxsize=8)
+def gauss_legendre(order):
+    nodes, weights = np.polynomial.legendre.leggauss(order)
+    nodes.setflags(write=False)
+    weights.setflags(write=False)
+    return nodes, weights
+
+def integrate_batch(integrand, a, b, tolerance=_LENGTH_TOLERANCE, order=_GAUSS_LEGENDRE_ORDER, max_depth=_LENGTH_MAX_DEPTH):
+    # Adaptive Gauss-Legendre quadrature of n integrals at once
+    # integrand(idx, x): idx (m,) integral index, x (m, k) evaluation points, returns (m, k) values
+    # Every interval is evaluated with `order` and `order // 2` nodes, intervals whose
+    # difference exceeds their share of the tolerance are halved until max_depth
+    # Returns (values, error bounds), the error bound is the sum of those differences
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    n = len(a)
+    values = np.zeros(n)
+    errors = np.zeros(n)
+    widths = np.abs(b - a)
+    widths[widths == 0] = 1.
+
+    nodesHigh, weightsHigh = gauss_legendre(order)
+    nodesLow, weightsLow = gauss_legendre(order // 2)
+
+    idx = np.arange(n)
+    lo = a
+    hi = b
+    for depth in range(max_depth + 1):
+        if len(idx) == 0:
+            break
+        half = ((hi - lo) / 2.)[:, None]
+        mid = ((hi + lo) / 2.)[:, None]
+        high = (integrand(idx, mid + half * nodesHigh) * weightsHigh).sum(axis=1) * half[:, 0]
+        low = (integrand(idx, mid + half * nodesLow) * weightsLow).sum(axis=1) * half[:, 0]
+        error = np.abs(high - low)
+
+        done = error <= tolerance * np.abs(hi - lo) / widths[idx]
+        if depth == max_depth:
+            done[:] = True
+        np.add.at(values, idx[done], high[done])
+        np.add.at(errors, idx[done], error[done])
+
+        split = ~done
+        idx = np.repeat(idx[split], 2)
+        mid = mid[split, 0]
+        lo, hi = (
+            np.column_stack((lo[split], mid)).ravel(),
+            np.column_stack((mid, hi[split])).ravel()
+        )
+
+    return values, errors
+
+def bezier_lengths(ctrl, tolerance=_LENGTH_TOLERANCE):
+    # ctrl: (n, degree + 1, 2) control points, returns (lengths, error bounds)
+    ctrl = np.asarray(ctrl, dtype=np.float64)
+    degree = ctrl.shape[1] - 1
+    # Power basis coefficients of the derivative, highest order first for Horner's method
+    coefs = bezier_poly_coefs(degree * np.diff(ctrl, axis=1))[:, ::-1]
+
+    def speed(idx, t):
+        c = coefs[idx]
+        vx = c[:, 0, 0, None]
+        vy = c[:, 0, 1, None]
+        for j in range(1, c.shape[1]):
+            vx = vx * t + c[:, j, 0, None]
+            vy = vy * t + c[:, j, 1, None]
+        return np_sqrt(vx * vx + vy * vy)
+
+    return integrate_batch(speed, np.zeros(len(ctrl)), np.ones(len(ctrl)), tolerance)
+
+def split_beziers(ctrl):
+    # de Casteljau split of n Bezier curves at t = 0.5, returns the (left, right) halves
+    levels = [ctrl]
+    while levels[-1].shape[1] > 1:
+        last = levels[-1]
+        levels.append((last[:, :-1] + last[:, 1:]) / 2.)
+    left = np.stack([level[:, 0] for level in levels], axis=1)
+    right = np.stack([level[:, -1] for level in levels[::-1]], axis=1)
+    return left, right
+
+def bezier_flatness(ctrl):
+    # Upper bound of the distance between n Bezier curves and their chords
+    degree = ctrl.shape[1] - 1
+    p0 = ctrl[:, :1]
+    chord = ctrl[:, -1:] - p0
+    chordLength2 = (chord ** 2).sum(axis=-1)
+    rel = ctrl[:, 1:-1] - p0
+    t = (rel * chord).sum(axis=-1) / np.where(chordLength2 == 0, 1., chordLength2)
+    inside = np.all((t >= 0) & (t <= 1), axis=1) & (chordLength2[:, 0] > 0)
+    # The curve never leaves the convex hull of its control points
+    t = np.clip(t, 0, 1)
+    distances = np_sqrt(((rel - chord * t[..., None]) ** 2).sum(axis=-1)).max(axis=1)
+    # With every control point projecting inside the chord the curve stays within
+    # its perpendicular offset, which the interior Bernstein weights scale by at most 1 - 2^(1 - degree)
+    return np.where(inside, distances * (1 - 2. ** (1 - degree)), distances)
+
+def flatten_beziers(ctrl, tolerance, max_depth=_FLATTEN_MAX_DEPTH):
+    # Adaptive flattening of n Bezier curves, ctrl: (n, degree + 1, 2)
+    # Pieces further than tolerance from their chord are split in half until max_depth
+    # Returns (curve index, points), the end points of all pieces in path order
+    # without the start point of each curve
+    ctrl = np.asarray(ctrl, dtype=np.float64)
+    idx = np.arange(len(ctrl))
+    order = np.zeros(len(ctrl))
+    pieceSize = 1.
+    doneIdx = []
+    doneOrder = []
+    donePoints = []
+
+    for depth in range(max_depth + 1):
+        if len(idx) == 0:
+            break
+        done = bezier_flatness(ctrl) <= tolerance
+        if depth == max_depth:
+            done[:] = True
+        doneIdx.append(idx[done])
+        doneOrder.append(order[done])
+        donePoints.append(ctrl[done, -1])
+
+        split = ~done
+        left, right = split_beziers(ctrl[split])
+        pieceSize /= 2.
+        idx = np.repeat(idx[split], 2)
+        order = np.column_stack((order[split], order[split] + pieceSize)).ravel()
+        ctrl = np.stack((left, right), axis=1).reshape((-1,) + ctrl.shape[1:])
+
+    idx = np.concatenate(doneIdx) if doneIdx else np.zeros(0, dtype=np.intp)
+    order = np.concatenate(doneOrder) if doneOrder else np.zeros(0)
+    points = np.concatenate(donePoints) if donePoints else np.zeros((0, 2))
+    sort = np.lexsort((order, idx))
+    return idx[sort], points[sort]
+
+def elliptical_arc_flat_counts(rx, ry, sweepAngle, tolerance):
+    # Sample counts keeping uniformly sampled arcs within tolerance of their chords,
+    # a chord over the angle step d deviates at most max(rx, ry) * (1 - cos(d / 2))
+    radius = np.maximum(np.asarray(rx, dtype=np.float64), np.asarray(ry, dtype=np.float64))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        step = 2 * np.arccos(np.clip(1 - tolerance / radius, -1, 1))
+        counts = np.ceil(np.abs(sweepAngle) / step)
+    counts = np.nan_to_num(counts, nan=1, posinf=_FLATTEN_MAX_SEGMENTS)
+    return np.clip(counts, 1, _FLATTEN_MAX_SEGMENTS).astype(np.int64) + 1
 
-    L, _ = quad(integrand, 0, 1)
-    return L
+def _angle_between(ux, uy, vx, vy):
+    p = ux * vx + uy * vy
+    n = np_sqrt((ux * ux + uy * uy) * (vx * vx + vy * vy))
+    sign = np.where(ux * vy - uy * vx < 0, -1., 1.)
+    return sign * np.arccos(np.clip(p / n, -1., 1.))
+
+def elliptical_arc_center(p0, rx, ry, xAxisRotation, largeArcFlag, sweepFlag, p1):
+    # Conversion from endpoint to center parameterization of n arcs at once
+    # http://www.w3.org/TR/SVG/implnote.html#ArcConversionEndpointToCenter
+    # p0, p1: (n, 2), the other arguments (n,)
+    # Returns (center (n, 2), rx, ry, rotation in radians, startAngle, sweepAngle, isLine),
+    # isLine marks arcs drawn as the straight line p0 -> p1 (identical endpoints or a zero radius)
+    p0 = np.asarray(p0, dtype=np.float64).reshape(-1, 2)
+    p1 = np.asarray(p1, dtype=np.float64).reshape(-1, 2)
+    rx = np.abs(np.asarray(rx, dtype=np.float64))
+    ry = np.abs(np.asarray(ry, dtype=np.float64))
+    rotation = np.radians(np.fmod(np.asarray(xAxisRotation, dtype=np.float64), 360.))
+    largeArcFlag = np.asarray(largeArcFlag) != 0
+    sweepFlag = np.asarray(sweepFlag) != 0
+
+    isLine = (rx == 0) | (ry == 0) | np.all(p0 == p1, axis=1)
+    # Placeholder radii so the line arcs do not divide by zero, their result is unused
+    rx = np.where(isLine, 1., rx)
+    ry = np.where(isLine, 1., ry)
+    cosRotation = np_cos(rotation)
+    sinRotation = np_sin(rotation)
+
+    # Step #1: Compute transformedPoint
+    dx = (p0[:, 0] - p1[:, 0]) / 2.
+    dy = (p0[:, 1] - p1[:, 1]) / 2.
+    dx = np.where(isLine, 1., dx)
+    tx = cosRotation * dx + sinRotation * dy
+    ty = -sinRotation * dx + cosRotation * dy
+
+    # Ensure radii are large enough
+    radiiCheck = tx ** 2 / rx ** 2 + ty ** 2 / ry ** 2
+    radiiScale = np.where(radiiCheck > 1, np_sqrt(radiiCheck), 1.)
+    rx = rx * radiiScale
+    ry = ry * radiiScale
+
+    # Step #2: Compute transformedCenter
+    cSquareNumerator = rx ** 2 * ry ** 2 - rx ** 2 * ty ** 2 - ry ** 2 * tx ** 2
+    cSquareRootDenom = rx ** 2 * ty ** 2 + ry ** 2 * tx ** 2
+    # Make sure this never drops below zero because of precision
+    cRadicand = np.maximum(cSquareNumerator / cSquareRootDenom, 0)
+    cCoef = np.where(largeArcFlag != sweepFlag, 1., -1.) * np_sqrt(cRadicand)
+    tcx = cCoef * ((rx * ty) / ry)
+    tcy = cCoef * (-(ry * tx) / rx)
+
+    # Step #3: Compute center
+    center = np.column_stack((
+        cosRotation * tcx - sinRotation * tcy + ((p0[:, 0] + p1[:, 0]) / 2.),
+        sinRotation * tcx + cosRotation * tcy + ((p0[:, 1] + p1[:, 1]) / 2.)
+    ))
+
+    # Step #4: Compute start/sweep angles
+    sx = (tx - tcx) / rx
+    sy = (ty - tcy) / ry
+    startAngle = _angle_between(1., 0., sx, sy)
+    sweepAngle = _angle_between(sx, sy, (-tx - tcx) / rx, (-ty - tcy) / ry)
+
+    sweepAngle = np.where(~sweepFlag & (sweepAngle > 0), sweepAngle - 2 * np_pi, sweepAngle)
+    sweepAngle = np.where(sweepFlag & (sweepAngle < 0), sweepAngle + 2 * np_pi, sweepAngle)
+    sweepAngle = np.fmod(sweepAngle, 2 * np_pi)
+
+    return center, rx, ry, rotation, startAngle, sweepAngle, isLine
+
+def elliptical_arc_points(p0, p1, arc, t):
+    # Points of n arcs at the shared sample parameters t, returns (n, len(t), 2)
+    # arc: the result of elliptical_arc_center for the same arcs
+    center, rx, ry, rotation, startAngle, sweepAngle, isLine = arc
+    p0 = np.asarray(p0, dtype=np.float64).reshape(-1, 1, 2)
+    p1 = np.asarray(p1, dtype=np.float64).reshape(-1, 1, 2)
+
+    # From http://www.w3.org/TR/SVG/implnote.html#ArcParameterizationAlternatives
+    angle = startAngle[:, None] + sweepAngle[:, None] * t
+    ex = rx[:, None] * np_cos(angle)
+    ey = ry[:, None] * np_sin(angle)
+    cosRotation = np_cos(rotation)[:, None]
+    sinRotation = np_sin(rotation)[:, None]
+    points = np.stack((
+        cosRotation * ex - sinRotation * ey + center[:, 0, None],
+        sinRotation * ex + cosRotation * ey + center[:, 1, None]
+    ), axis=-1)
+
+    line = p0 + (p1 - p0) * t[:, None]
+    return np.where(isLine[:, None, None], line, points)
+
+def ellipse_arc_lengths(rx, ry, startAngle, sweepAngle, tolerance=_LENGTH_TOLERANCE):
+    # Length of n arcs on axis aligned ellipses, returns (lengths, error bounds)
+    rx = np.asarray(rx, dtype=np.float64)
+    ry = np.asarray(ry, dtype=np.float64)
+    startAngle = np.asarray(startAngle, dtype=np.float64)
+
+    def speed(idx, angle):
+        return np_sqrt((rx[idx, None] * np_sin(angle)) ** 2 + (ry[idx, None] * np_cos(angle)) ** 2)
+
+    lengths, errors = integrate_batch(speed, startAngle, startAngle + sweepAngle, tolerance)
+    return np.abs(lengths), errors
+
+def elliptical_arc_lengths(p0, rx, ry, xAxisRotation, largeArcFlag, sweepFlag, p1, tolerance=_LENGTH_TOLERANCE):
+    # p0, p1: (n, 2), the other arguments (n,), returns (lengths, error bounds)
+    arc = elliptical_arc_center(p0, rx, ry, xAxisRotation, largeArcFlag, sweepFlag, p1)
+    return elliptical_arc_center_lengths(p0, p1, arc, tolerance)
+
+def elliptical_arc_center_lengths(p0, p1, arc, tolerance=_LENGTH_TOLERANCE):
+    # Same as elliptical_arc_lengths for arcs already solved by elliptical_arc_center
+    _, rx, ry, _, startAngle, sweepAngle, isLine = arc
+    p0 = np.asarray(p0, dtype=np.float64).reshape(-1, 2)
+    p1 = np.asarray(p1, dtype=np.float64).reshape(-1, 2)
+    lengths = np.hypot(*(p1 - p0).T)
+    errors = np.zeros(len(lengths))
+    isArc = ~isLine
+    lengths[isArc], errors[isArc] = ellipse_arc_lengths(
+        rx[isArc],
+        ry[isArc],
+        startAngle[isArc],
+        sweepAngle[isArc],
+        tolerance
+    )
+    return lengths, errors
+
+def segmented_cumsum(values, resets):
+    # Running sums that restart at every reset, where the value is kept as is
+    # The sums are added one by one from the reset, so they round the same way
+    # as adding the values in a loop, resets[0] must be True
+    values = np.asarray(values, dtype=np.float64)
+    result = values.copy()
+    starts = np.flatnonzero(resets)
+    lengths = np.diff(np.append(starts, len(values)))
+
+    # Short runs are summed together one position at a time
+    short = lengths <= _CUMSUM_SHORT_RUN
+    shortStarts = starts[short]
+    shortLengths = lengths[short]
+    for k in range(1, int(shortLengths.max(initial=0))):
+        alive = shortStarts[shortLengths > k] + k
+        result[alive] = result[alive - 1] + values[alive]
+
+    for start, length in zip(starts[~short].tolist(), lengths[~short].tolist()):
+        np.cumsum(values[start:start + length], out=result[start:start + length])
+    return result
+
+def cubic_bezier_length(p0, p1, p2, p3):
+    return bezier_lengths([[p0, p1, p2, p3]])[0][0]
+
+def quad_bezier_length(p0, p1, p2):
+    return bezier_lengths([[p0, p1, p2]])[0][0]
 
 def elliptical_arc_length(p0, rx, ry, xAxisRotation, largeArcFlag, sweepFlag, p1):
-    # 计算椭圆中心
-    cx = (p0[0] + p1[0]) / 2
-    cy = (p0[1] + p1[1]) / 2
-
-    # 计算椭圆半轴
-    a = rx
-    b = ry
-
-    # 计算椭圆旋转角度
-    theta = xAxisRotation
-
-    # 计算椭圆参数
-    h = (p1[0] - p0[0]) / 2
-    k = (p1[1] - p0[1]) / 2
-
-    # 计算椭圆弧的起始角度和终止角度
-    start_angle = np_arctan2(k, h)
-    if largeArcFlag == 1:
-        end_angle = start_angle + np_pi
-    else:
-        end_angle = start_angle
-
-    end_angle += np_pi
-
-    # 计算椭圆弧的长度
-    def integrand(angle):
-        x = cx + a * np_cos(angle) * np_cos(theta) - b * np_sin(angle) * np_sin(theta)
-        y = cy + a * np_cos(angle) * np_sin(theta) + b * np_sin(angle) * np_cos(theta)
-        return np_sqrt((x - p0[0])**2 + (y - p0[1])**2)
-
-    L, _ = quad(integrand, start_angle, end_angle)
-    return L
\ No newline at end of file
+    return elliptical_arc_lengths([p0], [rx], [ry], [xAxisRotation], [largeArcFlag], [sweepFlag], [p1])[0][0]
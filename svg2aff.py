@@ -1,19 +1,37 @@
 # NCat 20240905
 import numpy as np
 from math import (
-    tau as _tau,
     sqrt as _sqrt,
-    sin as _sin,
-    cos as _cos,
-    acos as _acos,
-    radians as _rad,
-    fmod as _fmod
+    gcd
 )
 from mathHelper import *
-import struct
+import re
+import io
+from array import array
+import os
+import heapq
+import shutil
+import tempfile
 
 _MIN_CURVE_COUNT = 3
-_LENGTH_SCALE = 30
+# Largest quantized coordinate mergeOverlaps handles with int64 products
+_MAX_INT64_QUANTIZED = 2 ** 30
+# Relative difference of distances that rdpImportance treats as a tie
+_RDP_TIE_TOLERANCE = 1e-9
+_WRITE_CHUNK_LINES = 4096
+# Commands converted at once by the streaming api
+_STREAM_CHUNK_COMMANDS = 8192
+_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+_MAX_AUTO_CURVE_COUNT = 128
+# Points sampled per curve to estimate its auto count
+_AUTO_PROBE_COUNT = 9
+# Allowed deviation of auto counted curves in world units
+_AUTO_MAX_DEVIATION = 2.
+# x2world(x) = (x * 850) - 425
+# y2world(y) = (y * 450) + 100
+_WORLD_SCALE = (850, 450)
+# Time of an aff line, the first integer argument of its event
+_AFF_TIME_RE = re.compile(r'\s*[a-z]*\(\s*(-?\d+)')
 
 class helper:
 
@@ -29,45 +47,386 @@ class helper:
         #     (pa, pb) = (pb, pa)
         return f'arc({t},{et},{pa.x:{p}},{pb.x:{p}},s,{pa.y:{p}},{pb.y:{p}},0,none,true);'
     
-def castToInt(f):
-    return struct.unpack('i', struct.pack('f', f))[0]
-
-def autoCalculateCount(length):
-    oLength = length
-    length *= _LENGTH_SCALE
-    count = length / 3
-    count /= oLength
-    return min(max(_MIN_CURVE_COUNT, int(count)), 32)
-
-def calcQuadBezierCount(p0, p1, p2, count, interval, useInterval, autoCurveCount):
-    if autoCurveCount or useInterval:
-        length = quad_bezier_length(p0.toNpArray(), p1.toNpArray(), p2.toNpArray())
-    if autoCurveCount:
-        return autoCalculateCount(length)
-    if useInterval:
-        count = length / interval
-        return max(_MIN_CURVE_COUNT, int(count))
-    return count
-
-def calcCubicBezierCount(p0, p1, p2, p3, count, interval, useInterval, autoCurveCount):
-    if autoCurveCount or useInterval:
-        length = cubic_bezier_length(p0.toNpArray(), p1.toNpArray(), p2.toNpArray(), p3.toNpArray())
-    if autoCurveCount:
-        return autoCalculateCount(length)
-    if useInterval:
-        count = length / interval
-        return max(_MIN_CURVE_COUNT, int(count))
-    return count
-
-def calcEllipticalArcCount(p0, rx, ry, xAxisRotation, largeArcFlag, sweepFlag, p1, count, interval, useInterval, autoCurveCount):
-    if autoCurveCount or useInterval:
-        length = elliptical_arc_length(p0.toNpArray(), rx, ry, xAxisRotation, largeArcFlag, sweepFlag, p1.toNpArray())
-    if autoCurveCount:
-        return autoCalculateCount(length)
+def roundArray(values, n):
+    # Same as round(x, n) on every value
+    # np.round only differs from it when x * 10^n is close to a tie
+    result = np.round(values, n)
+    if n > 22:
+        return np.array([round(x, n) for x in values.ravel().tolist()]).reshape(values.shape)
+    scaled = values * (10. ** n)
+    with np.errstate(invalid='ignore'):
+        fraction = np.abs(scaled - np.trunc(scaled))
+    unsure = ~(np.abs(fraction - .5) > 1e-6 + np.abs(scaled) * 2. ** -50)
+    if np.any(unsure):
+        result[unsure] = [round(x, n) for x in values[unsure].tolist()]
+    return result
+
+def _wrapAngle(a):
+    return np.abs((a + np.pi) % (2 * np.pi) - np.pi)
+
+def mergeCollinearRuns(vertices, isRunStart, tolerance):
+    # vertices: (n, 2) continuous runs of vertices, tolerance: radians
+    # Returns the mask of vertices to keep, the vertices between two kept ones
+    # are dropped when every line between them agrees with the line joining
+    # the kept ones within the tolerance
+    n = len(vertices)
+    keep = np.ones(n, dtype=np.bool_)
+    if n < 3:
+        return keep
+    delta = np.diff(vertices, axis=0)
+    angles = np.arctan2(delta[:, 1], delta[:, 0])
+    isEmpty = ~np.any(delta != 0, axis=1)
+
+    interior = np.zeros(n, dtype=np.bool_)
+    interior[1:-1] = ~isRunStart[1:-1] & ~isRunStart[2:]
+    turns = np.zeros(n)
+    turns[1:-1] = _wrapAngle(angles[1:] - angles[:-1])
+    turns[1:-1][isEmpty[1:] | isEmpty[:-1]] = 0
+    keep = ~interior | (turns > tolerance)
+
+    while True:
+        anchors = np.flatnonzero(keep)
+        spanStarts = anchors[:-1]
+        chords = vertices[anchors[1:]] - vertices[spanStarts]
+        chordAngles = np.arctan2(chords[:, 1], chords[:, 0])
+        chordLengths = np.hypot(chords[:, 0], chords[:, 1])
+
+        spans = np.searchsorted(anchors, np.arange(n - 1), side='right') - 1
+        deviations = _wrapAngle(angles - chordAngles[spans])
+        deviations[chordLengths[spans] == 0] = np.inf
+        deviations[isEmpty] = 0
+        isBad = np.maximum.reduceat(deviations, spanStarts) > tolerance
+        if not np.any(isBad):
+            return keep
+
+        # Keep the vertex farthest from the chord of every bad span
+        candidates = np.flatnonzero(~keep)
+        candidateSpans = spans[candidates]
+        selected = isBad[candidateSpans]
+        candidates = candidates[selected]
+        candidateSpans = candidateSpans[selected]
+        offsets = vertices[candidates] - vertices[spanStarts[candidateSpans]]
+        spanChords = chords[candidateSpans]
+        distances = np.where(
+            chordLengths[candidateSpans] > 0,
+            np.abs(offsets[:, 0] * spanChords[:, 1] - offsets[:, 1] * spanChords[:, 0]),
+            np.hypot(offsets[:, 0], offsets[:, 1])
+        )
+        order = np.lexsort((distances, candidateSpans))
+        isLast = np.ones(len(order), dtype=np.bool_)
+        isLast[:-1] = candidateSpans[order][1:] != candidateSpans[order][:-1]
+        keep[candidates[order[isLast]]] = True
+
+def rdpImportance(vertices, isRunStart, tolerance=0):
+    # Ramer-Douglas-Peucker on every run of vertices
+    # Returns the largest tolerance that still keeps each vertex, the ends of
+    # runs are always kept, simplifying with any tolerance t >= tolerance keeps
+    # the vertices whose importance is greater than t
+    # The pending spans of all runs are kept on a stack and every pass splits
+    # all of them at once
+    n = len(vertices)
+    runStarts = np.flatnonzero(isRunStart)
+    runEnds = np.append(runStarts[1:], n) - 1
+    importance = np.zeros(n)
+    importance[runStarts] = np.inf
+    importance[runEnds] = np.inf
+
+    selected = runEnds - runStarts > 1
+    stackStarts = runStarts[selected]
+    stackEnds = runEnds[selected]
+    stackImportance = np.full(len(stackStarts), np.inf)
+    while len(stackStarts):
+        counts = stackEnds - stackStarts - 1
+        offsets = np.cumsum(counts) - counts
+        spans = np.repeat(np.arange(len(counts)), counts)
+        indices = stackStarts[spans] + np.arange(len(spans)) - offsets[spans] + 1
+
+        # Distance to the line between the ends of the span
+        starts = vertices[stackStarts][spans]
+        chords = vertices[stackEnds][spans] - starts
+        rel = vertices[indices] - starts
+        chordLengths = np.sum(chords * chords, axis=1)
+        t = np.sum(rel * chords, axis=1) / np.where(chordLengths > 0, chordLengths, 1)
+        rel -= chords * np.clip(t, 0, 1)[:, None]
+        distances = np.hypot(rel[:, 0], rel[:, 1])
+
+        # Ties (up to rounding errors) go to the vertex closest to the middle
+        # of the span, otherwise equal corners of a staircase split next to the
+        # end every time and the passes grow with the run length
+        spanMax = np.maximum.reduceat(distances, offsets)
+        isTie = distances >= spanMax[spans] * (1 - _RDP_TIE_TOLERANCE)
+        fromMid = np.abs(2 * indices - (stackStarts + stackEnds)[spans])
+        order = np.lexsort((fromMid, ~isTie, spans))
+        farthest = order[offsets]
+        split = distances[farthest] > tolerance
+        splitStarts = stackStarts[split]
+        splitEnds = stackEnds[split]
+        mids = indices[farthest[split]]
+        midImportance = np.minimum(stackImportance[split], distances[farthest[split]])
+        importance[mids] = midImportance
+
+        stackStarts = np.concatenate((splitStarts, mids))
+        stackEnds = np.concatenate((mids, splitEnds))
+        stackImportance = np.concatenate((midImportance, midImportance))
+        selected = stackEnds - stackStarts > 1
+        stackStarts = stackStarts[selected]
+        stackEnds = stackEnds[selected]
+        stackImportance = stackImportance[selected]
+    return importance
+
+def simplifyRuns(vertices, isRunStart, tolerance):
+    # Returns the mask of vertices to keep
+    return rdpImportance(vertices, isRunStart, tolerance) > tolerance
+
+def simplifyError(vertices, keep):
+    # Largest distance from a dropped vertex to the line that replaced it
+    dropped = np.flatnonzero(~keep)
+    if len(dropped) == 0:
+        return 0.
+    kept = np.flatnonzero(keep)
+    nexts = np.searchsorted(kept, dropped)
+    starts = vertices[kept[nexts - 1]]
+    chords = vertices[kept[nexts]] - starts
+    rel = vertices[dropped] - starts
+    chordLengths = np.sum(chords * chords, axis=1)
+    t = np.sum(rel * chords, axis=1) / np.where(chordLengths > 0, chordLengths, 1)
+    rel -= chords * np.clip(t, 0, 1)[:, None]
+    return float(np.max(np.hypot(rel[:, 0], rel[:, 1])))
+
+def fitArcCount(vertices, isRunStart, ndigits, removeOverlaps, tolerance, maxArcCount):
+    # Searches the smallest simplify tolerance (not less than tolerance) whose
+    # result has at most maxArcCount lines, uses the largest one if none does
+    # Returns the mask of vertices to keep and the tolerance
+    # Any importance above tolerance may be selected, so the hierarchy is built
+    # down to it, with ties split at the middle this takes O(log n) passes
+    importance = rdpImportance(vertices, isRunStart, tolerance)
+
+    def countLines(t):
+        keep = importance > t
+        return len(vertices2Lines(vertices[keep], isRunStart[keep], ndigits, removeOverlaps)[0])
+
+    if countLines(tolerance) <= maxArcCount:
+        return importance > tolerance, tolerance
+    # The result only changes at the importance of some vertex
+    candidates = np.unique(importance[np.isfinite(importance) & (importance > tolerance)])
+    if len(candidates) == 0:
+        return importance > tolerance, tolerance
+    lo = 0
+    hi = len(candidates) - 1
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if countLines(candidates[mid]) <= maxArcCount:
+            hi = mid
+        else:
+            lo = mid + 1
+    tolerance = float(candidates[lo])
+    return importance > tolerance, tolerance
+
+def vertices2Lines(vertices, isRunStart, ndigits, removeOverlaps=False, vertexSources=None):
+    # Returns the (n, 4) rounded lines between the neighbouring vertices of
+    # every run, without duplicated and zero length lines, and the source of
+    # each line, which is the source of its end vertex
+    connected = ~isRunStart[1:]
+    segments = np.hstack((vertices[:-1][connected], vertices[1:][connected]))
+    sources = None if vertexSources is None else vertexSources[1:][connected]
+
+    segments = roundArray(segments, ndigits)
+    starts = segments[:, :2]
+    ends = segments[:, 2:]
+    keep = np.any(starts != ends, axis=1)
+    # Keep the first one of the same lines, +0. makes -0. and 0. the same key
+    _, firsts = np.unique(segments + 0., axis=0, return_index=True)
+    isFirst = np.zeros(len(segments), dtype=np.bool_)
+    isFirst[firsts] = True
+    keep &= isFirst
+    delta = ends - starts
+    keep &= ~(np.sqrt(delta[:, 0] ** 2 + delta[:, 1] ** 2) < (10 ** (-ndigits)))
+
+    segments = segments[keep]
+    if sources is not None:
+        sources = sources[keep]
+    if removeOverlaps:
+        segments, indices = mergeOverlaps(segments, ndigits)
+        if sources is not None:
+            sources = sources[indices]
+    return segments, sources
+
+def _overlapKeys(quantized):
+    # Index of the infinite line of every quantized (n, 4) line and the rank
+    # of both end points along it, the ranks are small enough to be packed
+    # into one integer with the line index
+    delta = quantized[:, 2:] - quantized[:, :2]
+    delta //= np.gcd(delta[:, 0], delta[:, 1])[:, None]
+    flip = (delta[:, 0] < 0) | ((delta[:, 0] == 0) & (delta[:, 1] < 0))
+    delta[flip] = -delta[flip]
+    lineOffsets = delta[:, 0] * quantized[:, 1] - delta[:, 1] * quantized[:, 0]
+    _, lines = np.unique(
+        np.stack((delta[:, 0], delta[:, 1], lineOffsets), axis=1),
+        axis=0,
+        return_inverse=True
+    )
+
+    positions = (
+        quantized[:, 0::2] * delta[:, 0, None] +
+        quantized[:, 1::2] * delta[:, 1, None]
+    )
+    _, ranks = np.unique(positions, return_inverse=True)
+    return lines.ravel(), ranks.reshape(positions.shape)
+
+def _overlapKeysExact(quantized):
+    # Same as _overlapKeys with python integers, for coordinates too large
+    # for int64 products
+    lineIndices = {}
+    lines = []
+    positions = []
+    for x0, y0, x1, y1 in quantized.tolist():
+        x0, y0, x1, y1 = int(x0), int(y0), int(x1), int(y1)
+        dx, dy = x1 - x0, y1 - y0
+        g = gcd(dx, dy) or 1
+        dx, dy = dx // g, dy // g
+        if dx < 0 or (dx == 0 and dy < 0):
+            dx, dy = -dx, -dy
+        lines.append(lineIndices.setdefault((dx, dy, dx * y0 - dy * x0), len(lineIndices)))
+        positions.append((x0 * dx + y0 * dy, x1 * dx + y1 * dy))
+    rankOf = {p: i for i, p in enumerate(sorted({p for pair in positions for p in pair}))}
+    ranks = np.array([(rankOf[p0], rankOf[p1]) for p0, p1 in positions], dtype=np.int64)
+    return np.array(lines, dtype=np.int64), ranks.reshape(-1, 2)
+
+def mergeOverlaps(segments, ndigits):
+    # segments: (n, 4) rounded lines without duplicates and zero lengths
+    # Lines on the same infinite line are hashed together by their reduced
+    # direction and offset, reversed lines and overlapping lines on a line
+    # are merged into one line
+    # Returns the lines and the index of the first line merged into each
+    quantized = np.rint(segments * (10. ** ndigits))
+    if len(segments) < 2 or not np.all(np.isfinite(quantized)):
+        return segments, np.arange(len(segments))
+    if np.all(np.abs(quantized) < _MAX_INT64_QUANTIZED):
+        lines, ranks = _overlapKeys(quantized.astype(np.int64))
+    else:
+        # The products below would overflow int64
+        lines, ranks = _overlapKeysExact(quantized)
+    reversed_ = ranks[:, 0] > ranks[:, 1]
+    lowRanks = np.where(reversed_, ranks[:, 1], ranks[:, 0])
+    highRanks = np.where(reversed_, ranks[:, 0], ranks[:, 1])
+    lows = np.where(reversed_[:, None], segments[:, 2:], segments[:, :2])
+    highs = np.where(reversed_[:, None], segments[:, :2], segments[:, 2:])
+
+    stride = 2 * len(segments)
+    order = np.lexsort((lowRanks, lines))
+    lowKeys = lines[order] * stride + lowRanks[order]
+    highKeys = lines[order] * stride + highRanks[order]
+    reach = np.maximum.accumulate(highKeys)
+    # A line starts a new group unless it starts before the farthest end of
+    # the lines before it, lines of previous infinite lines never reach it
+    isGroupStart = np.ones(len(order), dtype=np.bool_)
+    isGroupStart[1:] = lowKeys[1:] >= reach[:-1]
+    groupStarts = np.flatnonzero(isGroupStart)
+    groupSizes = np.diff(np.append(groupStarts, len(order)))
+    if np.all(groupSizes == 1):
+        return segments, np.arange(len(segments))
+
+    groups = np.cumsum(isGroupStart) - 1
+    farthest = order[np.lexsort((highKeys, groups))][np.append(groupStarts[1:], len(order)) - 1]
+    firsts = np.minimum.reduceat(order, groupStarts)
+    merged = np.hstack((lows[order[groupStarts]], highs[farthest]))
+    single = groupSizes == 1
+    merged[single] = segments[order[groupStarts]][single]
+    resultOrder = np.argsort(firsts, kind='stable')
+    return merged[resultOrder], firsts[resultOrder]
+
+_TRANSFORM_RE = re.compile(r'\s*(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)\s*,?')
+
+_TRANSFORM_ARG_COUNTS = {
+    'matrix': (6,),
+    'translate': (1, 2),
+    'scale': (1, 2),
+    'rotate': (1, 3),
+    'skewX': (1,),
+    'skewY': (1,)
+}
+
+def parseTransform(raw: str):
+    # SVG transform attribute (e.g. 'translate(10 20) rotate(45)') to a 3x3 matrix
+    matrix = np.identity(3)
+    pos = 0
+    raw = raw.strip()
+    while pos < len(raw):
+        match = _TRANSFORM_RE.match(raw, pos)
+        if match is None:
+            raise ValueError(f'invalid transform \'{raw[pos:]}\'')
+        pos = match.end()
+        name = match.group(1)
+        args = [float(x) for x in re.split(r'[\s,]+', match.group(2).strip()) if x]
+        if len(args) not in _TRANSFORM_ARG_COUNTS[name]:
+            raise ValueError(f'invalid argument count for transform \'{name}\'')
+
+        step = np.identity(3)
+        if name == 'matrix':
+            step[:2] = np.array(args).reshape(3, 2).T
+        elif name == 'translate':
+            step[:2, 2] = (args[0], args[1] if len(args) > 1 else 0)
+        elif name == 'scale':
+            step[0, 0] = args[0]
+            step[1, 1] = args[1] if len(args) > 1 else args[0]
+        elif name == 'rotate':
+            a = np.radians(args[0])
+            step[:2, :2] = ((np.cos(a), -np.sin(a)), (np.sin(a), np.cos(a)))
+            if len(args) > 1:
+                center = np.array(args[1:])
+                step[:2, 2] = center - step[:2, :2] @ center
+        elif name == 'skewX':
+            step[0, 1] = np.tan(np.radians(args[0]))
+        else:
+            step[1, 0] = np.tan(np.radians(args[0]))
+        matrix = matrix @ step
+    return matrix
+
+def transMatrix(offset, scale, scaleFirst, transform=''):
+    # 2x3 affine matrix of the svg transform followed by offset and scale
+    # scaleFirst
+    # True: p * scale + offset
+    # False: (p + offset) * scale
+    matrix = np.identity(3)
+    matrix[0, 0] = scale.x
+    matrix[1, 1] = scale.y
+    if scaleFirst:
+        matrix[:2, 2] = (offset.x, offset.y)
+    else:
+        matrix[:2, 2] = (offset.x * scale.x, offset.y * scale.y)
+    if transform:
+        matrix = matrix @ parseTransform(transform)
+    return matrix[:2]
+
+def transArray(points, matrix):
+    linear = matrix[:, :2]
+    if linear[0, 1] == 0 and linear[1, 0] == 0:
+        return points * linear.diagonal() + matrix[:, 2]
+    return points @ linear.T + matrix[:, 2]
+
+def autoCalculateCount(samples, lengthScale):
+    # samples: (n, k, 2) coarse points of n curves
+    # lengthScale: 2x2 linear map from path units to world units
+    # The count comes from the length and the total turning of each curve projected
+    # to Arcaea world units, over n lines a curve deviates about
+    # (length / n) * (turning / n) / 8 from its lines
+    world = samples @ lengthScale.T
+    chords = np.diff(world, axis=1)
+    chordLengths = np.hypot(chords[..., 0], chords[..., 1])
+    angles = np.arctan2(chords[..., 1], chords[..., 0])
+    turns = np.abs((np.diff(angles, axis=1) + np.pi) % (2 * np.pi) - np.pi)
+    turns[(chordLengths[:, 1:] == 0) | (chordLengths[:, :-1] == 0)] = 0
+    length = chordLengths.sum(axis=1)
+    turning = turns.sum(axis=1)
+    count = np.ceil(np.sqrt(length * turning / (8 * _AUTO_MAX_DEVIATION))) + 1
+    return np.clip(count, _MIN_CURVE_COUNT, _MAX_AUTO_CURVE_COUNT).astype(np.int64)
+
+def calcCurveCounts(lengths, count, interval, useInterval):
+    # Sample count of every curve from the array of their lengths
     if useInterval:
-        count = length / interval
-        return max(_MIN_CURVE_COUNT, int(count))
-    return count
+        counts = (lengths / interval).astype(np.int64)
+        return np.maximum(_MIN_CURVE_COUNT, counts)
+    return np.full(len(lengths), count, dtype=np.int64)
 
 def simpleList(l):
     result = []
@@ -80,36 +439,20 @@ def simpleList(l):
 def lengthOfTwoPoints(p0, p1):
     return _sqrt(_pow2(p1.x - p0.x) + _pow2(p1.y - p0.y))
 
-def _dot(p0, p1):
-    return p0.x * p1.x + p0.y * p1.y
-
-def _angleBetween(p0, p1):
-    p = _dot(p0, p1)
-    n = _sqrt(_dot(p0, p0) * _dot(p1, p1))
-    if p0.x * p1.y - p0.y * p1.x < 0:
-        sign = -1.
-    else:
-        sign = 1.
-
-    return sign * _acos(p / n)
-
-def _pointOnLine(p0, p1, t):
-    return p0 + (p1 - p0) * t
-
 def _pow2(x):
     return x ** 2.
 
 class point:
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y=None):
         self.x = x
-        self.y = y
-        if y is None:
-            self.y = x
+        self.y = x if y is None else y
 
     def trans(self, offset, scale, scaleFirst):
         if scaleFirst:
-            return self * scale + offset
-        return (self + offset) * scale
+            return point(self.x * scale.x + offset.x, self.y * scale.y + offset.y)
+        return point((self.x + offset.x) * scale.x, (self.y + offset.y) * scale.y)
 
     def __add__(self, other):
         return point(self.x + other.x, self.y + other.y)
@@ -118,19 +461,46 @@ class point:
         return point(self.x - other.x, self.y - other.y)
     
     def __truediv__(self, other):
-        if isinstance(other, (float, int)):
-            return point(self.x / other, self.y / other)
-        
-        return point(self.x / other.x, self.y / other.y)
+        if type(other) is point:
+            return point(self.x / other.x, self.y / other.y)
+        return point(self.x / other, self.y / other)
     
     def __mul__(self, other):
-        if isinstance(other, (float, int)):
-            return point(self.x * other, self.y * other)
-        
-        return point(self.x * other.x, self.y * other.y)
+        if type(other) is point:
+            return point(self.x * other.x, self.y * other.y)
+        return point(self.x * other, self.y * other)
+
+    # In place versions, modify and return self without allocating
+    def __iadd__(self, other):
+        self.x += other.x
+        self.y += other.y
+        return self
+
+    def __isub__(self, other):
+        self.x -= other.x
+        self.y -= other.y
+        return self
+
+    def __itruediv__(self, other):
+        if type(other) is point:
+            self.x /= other.x
+            self.y /= other.y
+        else:
+            self.x /= other
+            self.y /= other
+        return self
+
+    def __imul__(self, other):
+        if type(other) is point:
+            self.x *= other.x
+            self.y *= other.y
+        else:
+            self.x *= other
+            self.y *= other
+        return self
     
     def __eq__(self, other):
-        if not isinstance(other, point):
+        if type(other) is not point:
             return False
         return self.x == other.x and self.y == other.y
     
@@ -165,6 +535,103 @@ class point:
     def __str__(self):
         return '({}, {})'.format(self.x, self.y)
 
+class lineBuffer:
+    # Lines stored as one (n, 4) array, columns are x0, y0, x1, y1
+    # sources: index of the path command that produced each line
+    def __init__(self, data=None, sources=None):
+        if data is None:
+            data = np.empty((0, 4))
+        self.data = np.asarray(data, dtype=np.float64).reshape(-1, 4)
+        if sources is None:
+            sources = np.full(len(self.data), -1, dtype=np.intp)
+        self.sources = np.asarray(sources, dtype=np.intp)
+        self.__bounds = None
+        self.__lengths = None
+
+    @staticmethod
+    def fromLines(lines):
+        return lineBuffer([(p0.x, p0.y, p1.x, p1.y) for p0, p1 in lines])
+
+    @staticmethod
+    def concatenate(buffers):
+        buffers = list(buffers)
+        if not buffers:
+            return lineBuffer()
+        return lineBuffer(
+            np.concatenate([b.data for b in buffers]),
+            np.concatenate([b.sources for b in buffers])
+        )
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, (int, np.integer)):
+            x0, y0, x1, y1 = self.data[idx].tolist()
+            return (point(x0, y0), point(x1, y1))
+        return lineBuffer(self.data[idx], self.sources[idx])
+
+    def __iter__(self):
+        for x0, y0, x1, y1 in self.data.tolist():
+            yield (point(x0, y0), point(x1, y1))
+
+    def extend(self, other):
+        if not isinstance(other, lineBuffer):
+            other = lineBuffer(other)
+        self.data = np.concatenate((self.data, other.data))
+        self.sources = np.concatenate((self.sources, other.sources))
+        self.__bounds = None
+        self.__lengths = None
+
+    @property
+    def bounds(self):
+        # (min x, min y, max x, max y), infinite when empty
+        if self.__bounds is None:
+            if len(self.data) == 0:
+                inf = float('inf')
+                self.__bounds = (inf, inf, -inf, -inf)
+            else:
+                xs = self.data[:, 0::2]
+                ys = self.data[:, 1::2]
+                self.__bounds = (
+                    float(xs.min()),
+                    float(ys.min()),
+                    float(xs.max()),
+                    float(ys.max())
+                )
+        return self.__bounds
+
+    @property
+    def lengths(self):
+        if self.__lengths is None:
+            delta = self.ends - self.starts
+            self.__lengths = np.hypot(delta[:, 0], delta[:, 1])
+        return self.__lengths
+
+    @property
+    def x0(self):
+        return self.data[:, 0]
+
+    @property
+    def y0(self):
+        return self.data[:, 1]
+
+    @property
+    def x1(self):
+        return self.data[:, 2]
+
+    @property
+    def y1(self):
+        return self.data[:, 3]
+
+    @property
+    def starts(self):
+        return self.data[:, :2]
+
+    @property
+    def ends(self):
+        return self.data[:, 2:]
+
 class svgCommand:
     def __init__(self, commandType, isAbs, args):
         self.__commandType = commandType
@@ -187,32 +654,19 @@ class svgCommand:
     def args(self):
         return self.__args
         
-    @staticmethod
-    def __tryParseNumber(raw):
-        try:
-            return int(raw)
-        except:
-            try:
-                return float(raw)
-            except:
-                return
-
     @staticmethod
     def parseCommand(cmd):
-        cmd = cmd.strip()
-        splits = cmd.split(' ')
-
-        commandType = splits[0]
-        isAbs = commandType.isupper()
+        # One command string of parseCommands, every argument group after the
+        # first one is kept in args like before
+        commandType = None
         args = []
-
-        for item in splits[1:]:
-            arg = svgCommand.__tryParseNumber(item)
-
-            if arg != None:
-                args.append(arg)
-
-        return svgCommand(commandType, isAbs, args)
+        for t, a in tokenizePath(cmd):
+            if commandType is None:
+                commandType = t
+            args.extend(a)
+        if commandType is None:
+            raise ValueError(f'invalid command \'{cmd}\'')
+        return svgCommand(commandType, commandType.isupper(), args)
     
     def __str__(self):
         commandType = self.__commandType
@@ -223,11 +677,166 @@ class svgCommand:
         args = ' '.join([str(a) for a in self.__args])
 
         return commandType + ' ' + args
-    
+
+_COMMAND_TYPES = 'mlhvcsqtaz'
+(
+    _OP_M,
+    _OP_L,
+    _OP_H,
+    _OP_V,
+    _OP_C,
+    _OP_S,
+    _OP_Q,
+    _OP_T,
+    _OP_A,
+    _OP_Z
+) = range(len(_COMMAND_TYPES))
+
+# Argument index of the end point x / y of each opcode, -1 when the command
+# does not change that coordinate
+_END_X_ARGS = np.array([0, 0, 0, -1, 4, 2, 2, 0, 5, -1])
+_END_Y_ARGS = np.array([1, 1, -1, 0, 5, 3, 3, 1, 6, -1])
+
+class commandBuffer:
+    # Compact parsed path: one opcode / abs flag per command and a contiguous
+    # float64 argument array, args of command i are args[argOffsets[i]:argOffsets[i + 1]]
+    def __init__(self, opcodes, isAbs, argOffsets, args):
+        self.opcodes = opcodes
+        self.isAbs = isAbs
+        self.argOffsets = argOffsets
+        self.args = args
+
+    @staticmethod
+    def fromRaw(raw: str):
+        # Typed arrays keep 1 / 8 bytes per value instead of a python object
+        opcodes = array('B')
+        isAbs = array('B')
+        argCounts = array('q', [0])
+        args = array('d')
+
+        for commandType, cmdArgs in tokenizePath(raw):
+            opcodes.append(_COMMAND_TYPES.index(commandType.lower()))
+            isAbs.append(commandType.isupper())
+            argCounts.append(len(cmdArgs))
+            args.extend(cmdArgs)
+
+        return commandBuffer(
+            np.frombuffer(opcodes, dtype=np.uint8).copy(),
+            np.frombuffer(isAbs, dtype=np.uint8).astype(np.bool_),
+            np.cumsum(np.frombuffer(argCounts, dtype=np.int64), dtype=np.intp),
+            np.frombuffer(args, dtype=np.float64).copy()
+        )
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    def __getitem__(self, idx):
+        # Lazy svgCommand view, only built on access
+        commandType = _COMMAND_TYPES[self.opcodes[idx]]
+        isAbs = bool(self.isAbs[idx])
+        if isAbs:
+            commandType = commandType.upper()
+        args = self.args[self.argOffsets[idx]:self.argOffsets[idx + 1]].tolist()
+        return svgCommand(commandType, isAbs, args)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def slice(self, start, end):
+        argOffsets = self.argOffsets[start:end + 1]
+        return commandBuffer(
+            self.opcodes[start:end],
+            self.isAbs[start:end],
+            argOffsets - argOffsets[0],
+            self.args[argOffsets[0]:argOffsets[-1]]
+        )
+
+    def chunks(self, size):
+        # Split into (start, end) ranges of at least size commands, every range
+        # but the last ends with a close path command or before an absolute
+        # move to, the next group starts at the origin again and an absolute
+        # move to sets the position and the last move, so every range converts
+        # on its own
+        isBoundary = np.zeros(len(self) + 1, dtype=np.bool_)
+        isBoundary[1:] = self.opcodes == _OP_Z
+        isBoundary[:-1] |= (self.opcodes == _OP_M) & self.isAbs
+        result = []
+        start = 0
+        for end in np.flatnonzero(isBoundary).tolist():
+            if end == 0:
+                continue
+            if end - start >= size:
+                result.append((start, end))
+                start = end
+        if start < len(self) or not result:
+            result.append((start, len(self)))
+        return result
+
+
+class convertOptions:
+    # Everything one conversion needs, nothing is stored in module globals so
+    # conversions can run at the same time in different threads
+    def __init__(
+        self,
+        offset=None,
+        scale=None,
+        scaleFirst=True,
+        curveCount=7,
+        curveInterval=0.1,
+        curveUseInterval=False,
+        autoCurveCount=False,
+        ndigits=2,
+        curveTolerance=0,
+        removeOverlaps=False,
+        mergeAngle=0,
+        simplifyTolerance=0,
+        maxArcCount=0,
+        transform=''
+    ):
+        self.offset = point(0, 0) if offset is None else offset
+        self.scale = point(1, 1) if scale is None else scale
+        self.scaleFirst = scaleFirst
+        self.curveCount = curveCount
+        self.curveInterval = curveInterval
+        self.curveUseInterval = curveUseInterval
+        self.autoCurveCount = autoCurveCount
+        self.ndigits = ndigits
+        self.curveTolerance = curveTolerance
+        self.removeOverlaps = removeOverlaps
+        self.mergeAngle = mergeAngle
+        self.simplifyTolerance = simplifyTolerance
+        self.maxArcCount = maxArcCount
+        self.transform = transform
+
+        self.matrix = transMatrix(self.offset, self.scale, scaleFirst, transform)
+        # Linear map from path units to world units
+        self.lengthScale = np.diag(np.array(_WORLD_SCALE, dtype=np.float64)) @ self.matrix[:, :2]
+
+    def key(self):
+        # Every parameter above, equal keys convert a path to the same lines
+        return (
+            self.offset.x,
+            self.offset.y,
+            self.scale.x,
+            self.scale.y,
+            self.scaleFirst,
+            self.curveCount,
+            self.curveInterval,
+            self.curveUseInterval,
+            self.autoCurveCount,
+            self.ndigits,
+            self.curveTolerance,
+            self.removeOverlaps,
+            self.mergeAngle,
+            self.simplifyTolerance,
+            self.maxArcCount,
+            self.transform
+        )
 
 class svgGroups:
-    def __init__(self, groups):
-        self.__groups = groups
+    def __init__(self, buffer):
+        self.__buffer = buffer
 
     @staticmethod
     def __genArc(t, pa, pb):
@@ -242,525 +851,377 @@ class svgGroups:
             pb.y
         )
     
-    @staticmethod
-    def __quadraticBezierCurves(p0, p1, p2, t):
-        o = 1 - t
-        return (
-            pow(o, 2) * p0 +
-            2 * o * p1 * t +
-            pow(t, 2) * p2
-        )
+    def svg2vertices(self, options):
+        matrix = options.matrix
+        curveCount = options.curveCount
+        curveInterval = options.curveInterval
+        curveUseInterval = options.curveUseInterval
+        autoCurveCount = options.autoCurveCount
+        curveTolerance = options.curveTolerance
+
+        buffer = self.__buffer
+        opcodes = buffer.opcodes
+        isAbs = buffer.isAbs
+        argOffsets = buffer.argOffsets[:-1]
+        args = buffer.args
+
+        # A positive curve tolerance replaces the sample count by adaptive flattening
+        flatMode = curveTolerance > 0
+        # A curve with less than 2 samples never reaches its end point
+        skipCurves = not (flatMode or curveUseInterval or autoCurveCount) and curveCount <= 1
+
+        # The path is collected as continuous runs of vertices, every pair of
+        # neighbouring vertices in a run is one line. Each command adds one piece,
+        # either a single vertex or a curve whose sample count and samples are
+        # calculated for all curves together. Every group starts with a piece at
+        # the origin, a close path command ends its group with a piece at the
+        # last move and starts the next group.
+        isZ = opcodes == _OP_Z
+        hasPiece = ~isZ
+        if skipCurves:
+            hasPiece &= opcodes <= _OP_V
+        commandPieceCounts = np.where(isZ, 2, hasPiece.astype(np.intp))
+        commandPieces = np.cumsum(commandPieceCounts) - commandPieceCounts + 1
+        pieceCount = int(commandPieceCounts.sum()) + 1
+
+        closeCommands = np.flatnonzero(isZ)
+        closePieces = commandPieces[closeCommands]
+        originPieces = np.append(0, closePieces + 1)
+        commands = np.flatnonzero(hasPiece)
+        pieces = commandPieces[commands]
+        pieceOpcodes = opcodes[commands]
+        pieceArgOffsets = argOffsets[commands]
+        isRelative = ~isAbs[commands]
+
+        # Index of the command that added each piece
+        pieceCommands = np.zeros(pieceCount, dtype=np.intp)
+        pieceCommands[closePieces] = closeCommands
+        pieceCommands[closePieces + 1] = closeCommands
+        pieceCommands[pieces] = commands
+
+        # End position of every piece, on each axis the relative commands are
+        # running sums restarting at the origins and absolute commands
+        positions = np.zeros((pieceCount, 2))
+        for axis, endArgs in enumerate((_END_X_ARGS, _END_Y_ARGS)):
+            argIdx = endArgs[pieceOpcodes]
+            changes = argIdx >= 0
+            opPieces = np.concatenate((originPieces, pieces[changes]))
+            values = np.concatenate((
+                np.zeros(len(originPieces)),
+                args[pieceArgOffsets[changes] + argIdx[changes]]
+            ))
+            resets = np.concatenate((
+                np.ones(len(originPieces), dtype=np.bool_),
+                ~isRelative[changes]
+            ))
+            order = np.argsort(opPieces, kind='stable')
+            sums = segmented_cumsum(values[order], resets[order])
+            lastOps = np.searchsorted(opPieces[order], np.arange(pieceCount), side='right') - 1
+            positions[:, axis] = sums[lastOps]
+
+        isMovePiece = pieceOpcodes == _OP_M
+        isMove = np.zeros(pieceCount, dtype=np.bool_)
+        isMove[originPieces] = True
+        isMove[pieces[isMovePiece]] = True
+        lastMoves = np.maximum.accumulate(np.where(isMove, np.arange(pieceCount), 0))
+        positions[closePieces] = positions[lastMoves[closePieces]]
+
+        vertexPieces = np.sort(np.concatenate((originPieces, closePieces, pieces[pieceOpcodes <= _OP_V])))
+        vertexPositions = positions[vertexPieces]
+        runStartPieces = np.sort(np.concatenate((originPieces, pieces[isMovePiece])))
+
+        # Curves only need their start, end and control points
+        starts = positions[pieces - 1]
+        ends = positions[pieces]
+
+        def ctrlPoints(selected, k):
+            points = args[pieceArgOffsets[selected][:, None] + (k, k + 1)]
+            return np.where(isRelative[selected, None], starts[selected] + points, points)
+
+        isQ = pieceOpcodes == _OP_Q
+        isT = pieceOpcodes == _OP_T
+        isQuad = isQ | isT
+        quadPieces = pieces[isQuad]
+        quadCtrl = np.empty((len(quadPieces), 3, 2))
+        quadCtrl[:, 0] = starts[isQuad]
+        quadCtrl[:, 2] = ends[isQuad]
+        quadCtrl[isQ[isQuad], 1] = ctrlPoints(isQ, 0)
+        # T does not reflect the last control point, relative T uses twice the start
+        tStarts = starts[isT]
+        quadCtrl[isT[isQuad], 1] = np.where(isRelative[isT, None], tStarts + tStarts, tStarts)
+
+        isC = pieceOpcodes == _OP_C
+        isS = pieceOpcodes == _OP_S
+        isCubic = isC | isS
+        cubicPieces = pieces[isCubic]
+        cubicCtrl = np.empty((len(cubicPieces), 4, 2))
+        cubicCtrl[:, 0] = starts[isCubic]
+        cubicCtrl[:, 3] = ends[isCubic]
+        cubicCtrl[isC[isCubic], 1] = ctrlPoints(isC, 0)
+        cubicCtrl[isC[isCubic], 2] = ctrlPoints(isC, 2)
+        # S does not reflect the last control point either
+        cubicCtrl[isS[isCubic], 1] = starts[isS]
+        cubicCtrl[isS[isCubic], 2] = ctrlPoints(isS, 0)
+
+        isA = pieceOpcodes == _OP_A
+        arcPieces = pieces[isA]
+        arcArgs = np.hstack((
+            starts[isA],
+            args[pieceArgOffsets[isA][:, None] + np.arange(5)],
+            ends[isA]
+        ))
+
+        arcStarts = arcArgs[:, 0:2]
+        arcEnds = arcArgs[:, 7:9]
+        arcCenters = elliptical_arc_center(arcStarts, *arcArgs[:, 2:7].T, arcEnds)
+
+        if flatMode:
+            # Tolerance in path units, the transform stretches deviations by at most its norm
+            scaleNorm = np.linalg.norm(matrix[:, :2], 2)
+            flatTolerance = curveTolerance / scaleNorm if scaleNorm > 0 else float('inf')
+            quadFlat = flatten_beziers(quadCtrl, flatTolerance)
+            cubicFlat = flatten_beziers(cubicCtrl, flatTolerance)
+            quadCounts = np.bincount(quadFlat[0], minlength=len(quadCtrl)) + 1
+            cubicCounts = np.bincount(cubicFlat[0], minlength=len(cubicCtrl)) + 1
+            arcCounts = elliptical_arc_flat_counts(arcCenters[1], arcCenters[2], arcCenters[5], flatTolerance)
+            arcCounts[arcCenters[6]] = 2
+
+        elif autoCurveCount:
+            lengthScale = options.lengthScale
+            quadCounts = autoCalculateCount(bezier_points(quadCtrl, cached_bernstein_basis(2, _AUTO_PROBE_COUNT)), lengthScale)
+            cubicCounts = autoCalculateCount(bezier_points(cubicCtrl, cached_bernstein_basis(3, _AUTO_PROBE_COUNT)), lengthScale)
+            arcCounts = autoCalculateCount(elliptical_arc_points(
+                arcStarts,
+                arcEnds,
+                arcCenters,
+                cached_bezier_t(_AUTO_PROBE_COUNT)
+            ), lengthScale)
+            arcCounts[arcCenters[6]] = _MIN_CURVE_COUNT
 
-    @staticmethod
-    def __cubicBezierCurves(p0, p1, p2, p3, t):
-        o = 1 - t
-        return (
-            pow(o, 3) * p0 +
-            3 * pow(o, 2) * t * p1 +
-            3 * o * pow(t, 2) * p2 +
-            pow(t, 3) * p3
-        )
-    
-    @staticmethod
-    def __quadBezierCurvesPoint(p0, p1, p2, t):
-        return point(
-            svgGroups.__quadraticBezierCurves(
-                p0.x, p1.x, p2.x, t
-            ),
-            svgGroups.__quadraticBezierCurves(
-                p0.y, p1.y, p2.y, t
-            )
-        )
-    
-    @staticmethod
-    def __cubicBezierCurvesPoint(p0, p1, p2, p3, t):
-        return point(
-            svgGroups.__cubicBezierCurves(
-                p0.x, p1.x, p2.x, p3.x, t
-            ),
-            svgGroups.__cubicBezierCurves(
-                p0.y, p1.y, p2.y, p3.y, t
-            )
-        )
-
-    @staticmethod
-    def __ellipticalArc(
-            p0,
-            rx,
-            ry,
-            xAxisRotation,
-            largeArcFlag,
-            sweepFlag,
-            p1,
-            t
-        ):
-        
-        rx = abs(rx)
-        ry = abs(ry)
-        xAxisRotation = _fmod(xAxisRotation, 360.)
-        xAxisRotationRadians = _rad(xAxisRotation)
-        # If the endpoints are identical, then this is equivalent to omitting the elliptical arc segment entirely.
-        if p0 == p1:
-            return p0
-        
-        # If rx = 0 or ry = 0 then this arc is treated as a straight line segment joining the endpoints.
-        if rx == 0 or ry == 0:
-            return _pointOnLine(p0, p1, t)
-        
-        # Following "Conversion from endpoint to center parameterization"
-        # http://www.w3.org/TR/SVG/implnote.html#ArcConversionEndpointToCenter
-
-        # Step #1: Compute transformedPoint
-        dx = (p0.x - p1.x) / 2.
-        dy = (p0.y - p1.y) / 2.
-        transformedPoint = point(
-            _cos(xAxisRotationRadians) * dx + _sin(xAxisRotationRadians) * dy,
-            -_sin(xAxisRotationRadians) * dx + _cos(xAxisRotationRadians) * dy
-        )
-
-        # Ensure radii are large enough
-        radiiCheck = _pow2(transformedPoint.x) / _pow2(rx) + _pow2(transformedPoint.y) / _pow2(ry)
-        if radiiCheck > 1:
-            rx = _sqrt(radiiCheck) * rx
-            ry = _sqrt(radiiCheck) * ry
-
-        # Step #2: Compute transformedCenter
-        cSquareNumerator = _pow2(rx) * _pow2(ry) - _pow2(rx) * _pow2(transformedPoint.y) - _pow2(ry) * _pow2(transformedPoint.x)
-        cSquareRootDenom = _pow2(rx) * _pow2(transformedPoint.y) + _pow2(ry) * _pow2(transformedPoint.x)
-        cRadicand = cSquareNumerator / cSquareRootDenom
-        # Make sure this never drops below zero because of precision
-        if cRadicand < 0:
-            cRadicand = 0
-        if largeArcFlag != sweepFlag:
-            cCoefMul = 1
         else:
-            cCoefMul = -1
-        cCoef = cCoefMul * _sqrt(cRadicand)
-        transformedCenter = point(
-            cCoef * ((rx * transformedPoint.y) / ry),
-            cCoef * (-(ry * transformedPoint.x) / rx)
-        )
-        
-        # Step #3: Compute center
-        center = point(
-            _cos(xAxisRotationRadians) * transformedCenter.x - _sin(xAxisRotationRadians) * transformedCenter.y + ((p0.x + p1.x) / 2.),
-            _sin(xAxisRotationRadians) * transformedCenter.x + _cos(xAxisRotationRadians) * transformedCenter.y + ((p0.y + p1.y) / 2.)
-        )
-        
-        # Step #4: Compute start/sweep angles
-        # Start angle of the elliptical arc prior to the stretch and rotate operations.
-        # Difference between the start and end angles
-        startVector = point(
-            (transformedPoint.x - transformedCenter.x) / rx,
-            (transformedPoint.y - transformedCenter.y) / ry
-        )
-        startAngle = _angleBetween(point(1., 0.), startVector)
+            if curveUseInterval:
+                quadLengths = bezier_lengths(quadCtrl)[0]
+                cubicLengths = bezier_lengths(cubicCtrl)[0]
+                arcLengths = elliptical_arc_center_lengths(arcStarts, arcEnds, arcCenters)[0]
+            else:
+                quadLengths = np.zeros(len(quadCtrl))
+                cubicLengths = np.zeros(len(cubicCtrl))
+                arcLengths = np.zeros(len(arcArgs))
+
+            quadCounts = calcCurveCounts(quadLengths, curveCount, curveInterval, curveUseInterval)
+            cubicCounts = calcCurveCounts(cubicLengths, curveCount, curveInterval, curveUseInterval)
+            arcCounts = calcCurveCounts(arcLengths, curveCount, curveInterval, curveUseInterval)
+
+        # Lay out the vertices, a curve adds its samples without the start point
+        pieceVertexCounts = np.ones(pieceCount, dtype=np.intp)
+        pieceVertexCounts[quadPieces] = quadCounts - 1
+        pieceVertexCounts[cubicPieces] = cubicCounts - 1
+        pieceVertexCounts[arcPieces] = arcCounts - 1
+        pieceOffsets = np.cumsum(pieceVertexCounts) - pieceVertexCounts
+        vertexCount = int(pieceVertexCounts.sum())
+
+        vertices = np.empty((vertexCount, 2))
+        if len(vertexPieces):
+            vertices[pieceOffsets[vertexPieces]] = vertexPositions
+
+        if flatMode:
+            for pieces, counts, (curveIdx, points) in (
+                (quadPieces, quadCounts, quadFlat),
+                (cubicPieces, cubicCounts, cubicFlat)
+            ):
+                # Position of every flattened point inside its curve
+                rank = np.arange(len(curveIdx)) - (np.cumsum(counts - 1) - (counts - 1))[curveIdx]
+                vertices[pieceOffsets[pieces][curveIdx] + rank] = points
 
-        endVector = point(
-            (-transformedPoint.x - transformedCenter.x) / rx,
-            (-transformedPoint.y - transformedCenter.y) / ry
-        )
-        sweepAngle = _angleBetween(startVector, endVector)
-
-        if (not sweepFlag) and sweepAngle > 0:
-            sweepAngle -= _tau
-        elif sweepFlag and sweepAngle < 0:
-            sweepAngle += _tau
-        # We use % instead of `mod(..)` because we want it to be -360deg to 360deg(but actually in radians)
-        sweepAngle = _fmod(sweepAngle, _tau)
-
-        # From http://www.w3.org/TR/SVG/implnote.html#ArcParameterizationAlternatives
-        angle = startAngle + (sweepAngle * t)
-        ellipseComponentX = rx * _cos(angle)
-        ellipseComponentY = ry * _sin(angle)
-
-        return point(
-            _cos(xAxisRotationRadians) * ellipseComponentX - _sin(xAxisRotationRadians) * ellipseComponentY + center.x,
-            _sin(xAxisRotationRadians) * ellipseComponentX + _cos(xAxisRotationRadians) * ellipseComponentY + center.y
-        )
-    
-    def svg2lines(self, offset, scale, scaleFirst, curveCount, curveInterval, curveUseInterval, autoCurveCount, ndigits):
-        result = []
-        for group in self.__groups:
-            
-            hasZ = group[1]
-            group = group[0]
-            lastMovePosition = point(0, 0)
-            lastPosition = point(0, 0)
-            
-            for cmd in group:
-
-                if not isinstance(cmd, svgCommand):
-                    continue
-
-                cmdType = cmd.lowerCommandType
-                cmdIsAbs = cmd.isAbs
-                
-                if cmdType == 'm':
-                    position = point.fromArgs(*cmd.args)
-
-                    if cmdIsAbs:
-                        lastPosition = position.clone()
-                    else:
-                        lastPosition += position
-
-                    lastMovePosition = lastPosition
-                
-                elif cmdType == 'l':
-                    position = point.fromArgs(*cmd.args)
-
-                    targetPosition = lastPosition.clone()
-
-                    if cmdIsAbs:
-                        targetPosition = position.clone()
-                    else:
-                        targetPosition += position
-
-                    result.append((
-                        lastPosition.trans(offset, scale, scaleFirst), 
-                        targetPosition.trans(offset, scale, scaleFirst)
-                    ))
-
-                    lastPosition = targetPosition
-
-                elif cmdType == 'v':
-                    position = point(0, cmd.args[0])
-
-                    targetPosition = lastPosition.clone()
-
-                    if cmdIsAbs:
-                        targetPosition.y = position.y
-                    else:
-                        targetPosition.y += position.y
-                    
-                    result.append((
-                        lastPosition.trans(offset, scale, scaleFirst), 
-                        targetPosition.trans(offset, scale, scaleFirst)
-                    ))
-
-                    lastPosition = targetPosition
-
-                elif cmdType == 'h':
-                    position = point(cmd.args[0], 0)
-
-                    targetPosition = lastPosition.clone()
-
-                    if cmdIsAbs:
-                        targetPosition.x = position.x
-                    else:
-                        targetPosition.x += position.x
-                    
-                    result.append((
-                        lastPosition.trans(offset, scale, scaleFirst), 
-                        targetPosition.trans(offset, scale, scaleFirst)
-                    ))
-
-                    lastPosition = targetPosition
-
-                elif cmdType == 'q':
-                    cp0 = lastPosition.clone()
-                    cp1 = point(cmd.args[0], cmd.args[1])
-                    cp2 = point(cmd.args[2], cmd.args[3])
-
-                    if not cmdIsAbs:
-                        cp1 += lastPosition
-                        cp2 += lastPosition
-
-                    lastCurvePosition = lastPosition
-                    realCount = calcQuadBezierCount(
-                        cp0,
-                        cp1,
-                        cp2,
-                        curveCount,
-                        curveInterval,
-                        curveUseInterval,
-                        autoCurveCount
-                    )
-                    for i in range(realCount):
-                        if realCount <= 1:
-                            p = 0
-                        else:
-                            p = i / (realCount - 1.)
-                        position = self.__quadBezierCurvesPoint(
-                            cp0,
-                            cp1,
-                            cp2,
-                            p
-                        )
-                        result.append((
-                            lastCurvePosition.trans(offset, scale, scaleFirst), 
-                            position.trans(offset, scale, scaleFirst)
-                        ))
-                        lastCurvePosition = position
-
-                    lastPosition = lastCurvePosition
-
-                elif cmdType == 'c':
-                    cp0 = lastPosition.clone()
-                    cp1 = point(cmd.args[0], cmd.args[1])
-                    cp2 = point(cmd.args[2], cmd.args[3])
-                    cp3 = point(cmd.args[4], cmd.args[5])
-
-                    if not cmdIsAbs:
-                        cp1 += lastPosition
-                        cp2 += lastPosition
-                        cp3 += lastPosition
-
-                    lastCurvePosition = lastPosition
-                    realCount = calcCubicBezierCount(
-                        cp0,
-                        cp1,
-                        cp2,
-                        cp3,
-                        curveCount,
-                        curveInterval,
-                        curveUseInterval,
-                        autoCurveCount
-                    )
-                    for i in range(realCount):
-                        if realCount <= 1:
-                            p = 0
-                        else:
-                            p = i / (realCount - 1.)
-                        position = self.__cubicBezierCurvesPoint(
-                            cp0,
-                            cp1,
-                            cp2,
-                            cp3,
-                            p
-                        )
-                        result.append((
-                            lastCurvePosition.trans(offset, scale, scaleFirst), 
-                            position.trans(offset, scale, scaleFirst)
-                        ))
-                        lastCurvePosition = position
-
-                    lastPosition = lastCurvePosition
-
-                elif cmdType == 't':
-                    cp0 = lastPosition.clone()
-                    cp1 = lastPosition.clone()
-                    cp2 = point(cmd.args[0], cmd.args[1])
-
-                    if not cmdIsAbs:
-                        cp1 += lastPosition
-                        cp2 += lastPosition
-
-                    lastCurvePosition = lastPosition
-                    realCount = calcQuadBezierCount(
-                        cp0,
-                        cp1,
-                        cp2,
-                        curveCount,
-                        curveInterval,
-                        curveUseInterval,
-                        autoCurveCount
-                    )
-                    for i in range(realCount):
-                        if realCount <= 1:
-                            p = 0
-                        else:
-                            p = i / (realCount - 1.)
-                        position = self.__quadBezierCurvesPoint(
-                            cp0,
-                            cp1,
-                            cp2,
-                            p
-                        )
-                        result.append((
-                            lastCurvePosition.trans(offset, scale, scaleFirst), 
-                            position.trans(offset, scale, scaleFirst)
-                        ))
-                        lastCurvePosition = position
-
-                    lastPosition = lastCurvePosition
-
-                elif cmdType == 's':
-                    cp0 = lastPosition.clone()
-                    cp1 = lastPosition.clone()
-                    cp2 = point(cmd.args[0], cmd.args[1])
-                    cp3 = point(cmd.args[2], cmd.args[3])
-
-                    if not cmdIsAbs:
-                        cp2 += lastPosition
-                        cp3 += lastPosition
-
-                    lastCurvePosition = lastPosition
-                    realCount = calcCubicBezierCount(
-                        cp0,
-                        cp1,
-                        cp2,
-                        cp3,
-                        curveCount,
-                        curveInterval,
-                        curveUseInterval,
-                        autoCurveCount
-                    )
-                    for i in range(realCount):
-                        if realCount <= 1:
-                            p = 0
-                        else:
-                            p = i / (realCount - 1.)
-                        position = self.__cubicBezierCurvesPoint(
-                            cp0,
-                            cp1,
-                            cp2,
-                            cp3,
-                            p
-                        )
-                        result.append((
-                            lastCurvePosition.trans(offset, scale, scaleFirst), 
-                            position.trans(offset, scale, scaleFirst)
-                        ))
-                        lastCurvePosition = position
-
-                    lastPosition = lastCurvePosition
-
-                elif cmdType == 'a':
-                    p0 = lastPosition.clone()
-
-                    (rx,
-                    ry,
-                    xAxisRotation,
-                    largeArcFlag,
-                    sweepFlag,
-                    p1x,
-                    p1y) = cmd.args
-
-                    p1 = point(p1x, p1y)
-
-                    if not cmd.isAbs:
-                        p1 += lastPosition
-                    
-                    lastCurvePosition = lastPosition
-                    realCount = calcEllipticalArcCount(
-                        p0,
-                        rx,
-                        ry,
-                        xAxisRotation,
-                        largeArcFlag,
-                        sweepFlag,
-                        p1,
-                        curveCount,
-                        curveInterval,
-                        curveUseInterval,
-                        autoCurveCount
+        else:
+            # Evaluate all curves sharing a degree and sample count with one matrix product
+            for degree, pieces, ctrl, counts in (
+                (2, quadPieces, quadCtrl, quadCounts),
+                (3, cubicPieces, cubicCtrl, cubicCounts)
+            ):
+                slotOffsets = pieceOffsets[pieces]
+                for count in np.unique(counts).tolist():
+                    selected = counts == count
+                    samples = bezier_points(
+                        ctrl[selected],
+                        cached_bernstein_basis(degree, count)
                     )
-                    for i in range(realCount):
-                        if realCount <= 1:
-                            p = 0
-                        else:
-                            p = i / (realCount - 1.)
-                        position = svgGroups.__ellipticalArc(
-                            p0,
-                            rx,
-                            ry,
-                            xAxisRotation,
-                            largeArcFlag,
-                            sweepFlag,
-                            p1,
-                            p
-                        )
-                        result.append((
-                            lastCurvePosition.trans(offset, scale, scaleFirst), 
-                            position.trans(offset, scale, scaleFirst)
-                        ))
-                        lastCurvePosition = position
-
-                    lastPosition = lastCurvePosition
-
-            if hasZ:
-                result.append((
-                    lastPosition.trans(offset, scale, scaleFirst), 
-                    lastMovePosition.trans(offset, scale, scaleFirst)
-                ))
-        
-        nResult = []
-        nHashCodes = []
-        for l in result:
-            l = list(map(lambda x: x.roundNdigits(ndigits), l))
-            if l[0] == l[1]:
-                continue
-            h = -120818822
-            h = h * -1521134295 + castToInt(l[0].x)
-            h = h % (2 ** 63 - 1) - (2 ** 31 - 1)
-            h = h * -1521134295 + castToInt(l[0].y)
-            h = h % (2 ** 63 - 1) - (2 ** 31 - 1)
-            h = h * -1521134295 + castToInt(l[1].x)
-            h = h % (2 ** 63 - 1) - (2 ** 31 - 1)
-            h = h * -1521134295 + castToInt(l[1].y)
-            h = h % (2 ** 63 - 1) - (2 ** 31 - 1)
-            if h in nHashCodes:
-                # print('!', h)
-                continue
-            nHashCodes.append(h)
-            length = lengthOfTwoPoints(*l)
-            if length < (10 ** (-ndigits)):
-                continue
-            nResult.append(l)
-        
-        result = nResult
-        return result
-
-def parseCommands(raw: str):
-
-    strLen = len(raw)
-    i = 0
-    
-    commands = []
-    lastCommand = ''
-
-    commandIdentifier = [
-        'm', # Move to
-        'l', # Line to
-        'q', # Quad Curve to
-        't', # Shorthand Quad Curve to
-        'c', # Cubic Curve to
-        's', # Shorthand Cubic Curve to
-        'v', # Vertical Line to
-        'h', # Horizontal Line to
-        'a', # Elliptical Arc
-        'z'  # Close path
-    ]
-    
-    numberChars = '1234567890-+.'
-
-    commandTypeHasSpace = False
-    
-    while i < strLen:
-        c = raw[i]
-
-        if c.lower() in commandIdentifier:
-
-            if lastCommand != '':
-                commands.append(lastCommand)
-                
-            lastCommand = c + ' '
-
-            commandTypeHasSpace = True
+                    slots = slotOffsets[selected][:, None] + np.arange(count - 1)
+                    vertices[slots] = samples[:, 1:]
+
+        slotOffsets = pieceOffsets[arcPieces]
+        for count in np.unique(arcCounts).tolist():
+            selected = arcCounts == count
+            samples = elliptical_arc_points(
+                arcStarts[selected],
+                arcEnds[selected],
+                [a[selected] for a in arcCenters],
+                cached_bezier_t(count)
+            )
+            # Ends exactly on the end point, the next command starts from there
+            samples[:, -1] = arcEnds[selected]
+            slots = slotOffsets[selected][:, None] + np.arange(count - 1)
+            vertices[slots] = samples[:, 1:]
+
+        vertices = transArray(vertices, matrix)
+
+        isRunStart = np.zeros(vertexCount, dtype=np.bool_)
+        isRunStart[pieceOffsets[runStartPieces]] = True
+        vertexSources = np.repeat(pieceCommands, pieceVertexCounts)
+        return vertices, isRunStart, vertexSources
+
+    def svg2lines(self, options, stats=None):
+        ndigits = options.ndigits
+        removeOverlaps = options.removeOverlaps
+        mergeAngle = options.mergeAngle
+        simplifyTolerance = options.simplifyTolerance
+        maxArcCount = options.maxArcCount
+
+        vertices, isRunStart, vertexSources = self.svg2vertices(options)
+
+        keep = np.ones(len(vertices), dtype=np.bool_)
+        if mergeAngle > 0:
+            keep = mergeCollinearRuns(vertices, isRunStart, np.radians(mergeAngle))
+        if maxArcCount > 0:
+            keep[keep], simplifyTolerance = fitArcCount(
+                vertices[keep],
+                isRunStart[keep],
+                ndigits,
+                removeOverlaps,
+                simplifyTolerance,
+                maxArcCount
+            )
+        elif simplifyTolerance > 0:
+            keep[keep] = simplifyRuns(vertices[keep], isRunStart[keep], simplifyTolerance)
+        segments, sources = vertices2Lines(vertices[keep], isRunStart[keep], ndigits, removeOverlaps, vertexSources[keep])
+
+        if stats is not None:
+            stats['arcCount'] = len(segments)
+            stats['maxError'] = simplifyError(vertices, keep)
+            stats['simplifyTolerance'] = simplifyTolerance
+
+        return lineBuffer(segments, sources)
+
+_COMMAND_ARG_COUNTS = {
+    'm': 2, # Move to
+    'l': 2, # Line to
+    'q': 4, # Quad Curve to
+    't': 2, # Shorthand Quad Curve to
+    'c': 6, # Cubic Curve to
+    's': 4, # Shorthand Cubic Curve to
+    'v': 1, # Vertical Line to
+    'h': 1, # Horizontal Line to
+    'a': 7, # Elliptical Arc
+    'z': 0  # Close path
+}
+
+# The last group matches anything that is not a token or a separator
+_PATH_TOKEN_RE = re.compile(
+    r'([MmLlQqTtCcSsVvHhAaZz])|([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)|([^\s,])'
+)
 
-            i += 1
+def tokenizePath(raw: str):
+    # Single pass over the raw path, yields (commandType, args) per command.
+    # Accepts minified data such as "M1.5.5l-1-2e-1", implicit repeated commands
+    # and packed arc flags ("a1 1 0 011 1")
+
+    commandType = None
+    argCount = 0
+    args = []
+
+    for m in _PATH_TOKEN_RE.finditer(raw):
+        c, number, invalid = m.groups()
+
+        if invalid is not None:
+            raise ValueError(f'invalid character \'{invalid}\' at {m.start()} in path')
+
+        if c is not None:
+            if args:
+                raise ValueError(f'invalid argument count for command \'{commandType}\'')
+            commandType = c
+            argCount = _COMMAND_ARG_COUNTS[c.lower()]
+            if argCount == 0:
+                yield commandType, args
+                args = []
             continue
-        
-        elif c in numberChars:
-            if c in [ '+', '-' ] and lastCommand[-1] != ' ':
-                lastCommand += ' '
-            lastCommand += c
-
-        elif (c == ' ' or c == ',') and (not commandTypeHasSpace):
-            lastCommand += ' '
-        
-        if commandTypeHasSpace:
-            commandTypeHasSpace = False
-
-        i += 1
 
-    if lastCommand != '':
-        commands.append(lastCommand)
+        if commandType is None or argCount == 0:
+            raise ValueError(f'number \'{number}\' at {m.start()} in path has no command')
+
+        while number:
+            idx = len(args)
+            # Arc flags are a single '0' or '1' and may be written without separators
+            if argCount == 7 and (idx == 3 or idx == 4) and number[0] in '01':
+                args.append(float(number[0]))
+                number = number[1:]
+            else:
+                args.append(float(number))
+                number = ''
+
+            if len(args) == argCount:
+                yield commandType, args
+                args = []
+                # Extra coordinate pairs after a move to are implicit line to
+                if commandType == 'M':
+                    commandType = 'L'
+                elif commandType == 'm':
+                    commandType = 'l'
+
+    if args:
+        raise ValueError(f'invalid argument count for command \'{commandType}\'')
 
-    return commands
-
-def svgPath2Aff(
+def parseCommands(raw: str):
+    # Command strings such as 'L 1.0 2.0', one per command
+    return [str(c) for c in commandBuffer.fromRaw(raw)]
+
+def formatArcs(times, endTimes, lines, ndigits):
+    # Yields 'arc(time,endTime,x0,x1,s,y0,y1,0,none,true);' of every (n, 4) line
+    # in chunks of lines joined by new lines, same text as helper.genArcWithEnd
+    # All numbers of a chunk are formatted by one % call, %.Nf gives the same
+    # text as {:.Nf}
+    # A single time is written as given like {t}, time arrays hold integers
+    p = f'%.{ndigits}f'
+    timeColumns = [t for t in (times, endTimes) if np.ndim(t) > 0]
+    timeFormats = ['%d' if np.ndim(t) > 0 else f'{t}'.replace('%', '%%') for t in (times, endTimes)]
+    template = f'arc({timeFormats[0]},{timeFormats[1]},{p},{p},s,{p},{p},0,none,true);'
+    k = len(timeColumns)
+    rows = np.empty((len(lines), k + 4))
+    for i, t in enumerate(timeColumns):
+        rows[:, i] = t
+    rows[:, k:k + 2] = lines[:, 0::2]
+    rows[:, k + 2:k + 4] = lines[:, 1::2]
+    for start in range(0, len(rows), _WRITE_CHUNK_LINES):
+        chunk = rows[start:start + _WRITE_CHUNK_LINES]
+        yield '\n'.join([template] * len(chunk)) % tuple(chunk.ravel().tolist())
+
+def affArcs(lines, tick, endTick, offset, offsetEnd, useZPosMode):
+    # Returns the times, end times and (n, 4) lines of the arcs of a lineBuffer
+    if useZPosMode:
+        # Times and y follow the height of each end point between the lowest
+        # and highest one, x is shifted along offsetEnd, the returned arrays are
+        # new so the lines stay untouched
+        _, minY, _, maxY = lines.bounds
+        if len(lines) > 0 and maxY == minY:
+            raise ZeroDivisionError('float division by zero')
+        data = lines.data
+        t = (data[:, 1::2] - minY) / (maxY - minY)
+        swap = t[:, 0] > t[:, 1]
+        t = np.where(swap[:, None], t[:, ::-1], t)
+        x = np.where(swap[:, None], data[:, 2::-2], data[:, 0::2]) + t * offsetEnd.x
+        result = np.empty_like(data)
+        result[:, 0::2] = x
+        result[:, 1::2] = offset.y + t * offsetEnd.y
+        # Truncated like int()
+        times = np.trunc(tick + t * (endTick - tick))
+        return times[:, 0], times[:, 1], result
+
+    # Same as helper.genArc, the lower end goes first
+    data = lines.data
+    swap = data[:, 1] > data[:, 3]
+    data = np.where(swap[:, None], data[:, [2, 3, 0, 1]], data)
+    return tick, tick, data
+
+def _affTextChunks(
     raw,
     tick,
     endTick,
@@ -773,86 +1234,295 @@ def svgPath2Aff(
     curveUseInterval,
     autoCurveCount,
     format_,
-    useZPosMode
+    useZPosMode,
+    curveTolerance=0,
+    removeOverlaps=False,
+    mergeAngle=0,
+    simplifyTolerance=0,
+    maxArcCount=0,
+    transform='',
+    stats=None
 ):
     if format_[0] == 'f':
         ndigits = int(format_[1:])
-        format_ = f'.{format_[1:]}f'
-    
-    lines = svgPath2Lines(raw, offset, scale, scaleFirst, curveCount, curveInterval, curveUseInterval, autoCurveCount, ndigits)
-    result = []
 
-    if useZPosMode:
-        minY = float('inf')
-        maxY = float('-inf')
-
-        for line in lines:
-            p0, p1 = line
-            minY = min(minY, p0.y, p1.y)
-            maxY = max(maxY, p0.y, p1.y)
-        
-        def invLerp(y):
-            return (y - minY) / (maxY - minY)
-        
-        def lerpTime(t):
-            return int(tick + t * (endTick - tick))
-        
-        def lerpXOffset(t):
-            return t * offsetEnd.x
-        
-        def lerpYOffset(t):
-            return offset.y + t * offsetEnd.y
-        
-        for line in lines:
-            p0, p1 = line
-            t0, t1 = invLerp(p0.y), invLerp(p1.y)
-            if t0 > t1:
-                t0, t1 = t1, t0
-                p0, p1 = p1, p0
-            p0.x += lerpXOffset(t0)
-            p1.x += lerpXOffset(t1)
-            p0.y, p1.y = lerpYOffset(t0), lerpYOffset(t1)
-            time, endTime = lerpTime(t0), lerpTime(t1)
-            result.append(helper.genArcWithEnd(time, endTime, p0, p1, format_))
-
-    else:
-        for line in lines:
-            result.append(helper.genArc(tick, line[0], line[1], format_))
-
-    result = '\n'.join(result)
-    return result
+    options = convertOptions(
+        offset,
+        scale,
+        scaleFirst,
+        curveCount,
+        curveInterval,
+        curveUseInterval,
+        autoCurveCount,
+        ndigits,
+        curveTolerance,
+        removeOverlaps,
+        mergeAngle,
+        simplifyTolerance,
+        maxArcCount,
+        transform
+    )
+    yield from _linesAffTextChunks(
+        svgPath2LinesIter(raw, options, stats),
+        tick,
+        endTick,
+        offset,
+        offsetEnd,
+        ndigits,
+        useZPosMode
+    )
 
-def svgPath2Lines(raw, offset, scale, scaleFirst, curveCount, curveInterval, curveUseInterval, autoCurveCount, ndigits):
-    global _LENGTH_SCALE
+def _linesAffTextChunks(chunks, tick, endTick, offset, offsetEnd, ndigits, useZPosMode):
+    if useZPosMode:
+        # Times depend on the bounds of all lines
+        chunks = [lineBuffer.concatenate(chunks)]
 
-    _LENGTH_SCALE = max(abs(scale.x), abs(scale.y)) * 25
+    for lines in chunks:
+        times, endTimes, data = affArcs(lines, tick, endTick, offset, offsetEnd, useZPosMode)
+        yield from formatArcs(times, endTimes, data, ndigits)
 
-    commands = parseCommands(raw)
-    parsedCommands = []
+def lines2AffChunks(lines, tick, endTick, offset, offsetEnd, format_, useZPosMode):
+    # Yields the text of svgPath2Aff for the lineBuffer of svgPath2Lines in
+    # chunks of lines, join them by new lines
+    if format_[0] == 'f':
+        ndigits = int(format_[1:])
 
-    for cmd in commands:
-        parsedCommands.append(svgCommand.parseCommand(cmd))
+    yield from _linesAffTextChunks(
+        [lines],
+        tick,
+        endTick,
+        offset,
+        offsetEnd,
+        ndigits,
+        useZPosMode
+    )
 
-    groups = []
-    lastGroup = []
-    hasZ = False
+def writeChunks(stream, chunks):
+    # Writes text chunks joined by new lines to a text stream
+    for i, text in enumerate(chunks):
+        if i > 0:
+            stream.write('\n')
+        stream.write(text)
 
-    for cmd in parsedCommands:
+def svgPath2AffIter(*args, **kwargs):
+    # Yields the arc lines of svgPath2Aff one by one, takes the same arguments
+    for text in _affTextChunks(*args, **kwargs):
+        yield from text.split('\n')
 
-        if cmd.lowerCommandType == 'z':
-            hasZ = True
-            groups.append((lastGroup, hasZ))
-            lastGroup = []
-            hasZ = False
+def svgPath2AffWriteTo(stream, *args, **kwargs):
+    # Writes the text of svgPath2Aff to a text stream chunk by chunk, takes the
+    # same arguments after the stream
+    writeChunks(stream, _affTextChunks(*args, **kwargs))
 
-        lastGroup.append(cmd)
+def svgPath2Aff(
+    raw,
+    tick,
+    endTick,
+    offset,
+    offsetEnd,
+    scale,
+    scaleFirst,
+    curveCount,
+    curveInterval,
+    curveUseInterval,
+    autoCurveCount,
+    format_,
+    useZPosMode,
+    curveTolerance=0,
+    removeOverlaps=False,
+    mergeAngle=0,
+    simplifyTolerance=0,
+    maxArcCount=0,
+    transform='',
+    stats=None
+):
+    result = io.StringIO()
+    svgPath2AffWriteTo(
+        result,
+        raw,
+        tick,
+        endTick,
+        offset,
+        offsetEnd,
+        scale,
+        scaleFirst,
+        curveCount,
+        curveInterval,
+        curveUseInterval,
+        autoCurveCount,
+        format_,
+        useZPosMode,
+        curveTolerance,
+        removeOverlaps,
+        mergeAngle,
+        simplifyTolerance,
+        maxArcCount,
+        transform,
+        stats
+    )
+    return result.getvalue()
 
-    if lastGroup != []:
-        groups.append((lastGroup, hasZ))
-    
-    groups = svgGroups(groups)
-    return groups.svg2lines(offset, scale, scaleFirst, curveCount, curveInterval, curveUseInterval, autoCurveCount, ndigits)
+def svgPath2Lines(raw, offset, scale, scaleFirst, curveCount, curveInterval, curveUseInterval, autoCurveCount, ndigits, curveTolerance=0, removeOverlaps=False, mergeAngle=0, simplifyTolerance=0, maxArcCount=0, transform='', stats=None):
+    options = convertOptions(
+        offset,
+        scale,
+        scaleFirst,
+        curveCount,
+        curveInterval,
+        curveUseInterval,
+        autoCurveCount,
+        ndigits,
+        curveTolerance,
+        removeOverlaps,
+        mergeAngle,
+        simplifyTolerance,
+        maxArcCount,
+        transform
+    )
+    return svgPath2LinesWithOptions(raw, options, stats)
+
+def svgPath2LinesWithOptions(raw, options, stats=None):
+    # raw can also be an already parsed commandBuffer
+    if not isinstance(raw, commandBuffer):
+        raw = commandBuffer.fromRaw(raw)
+    return svgGroups(raw).svg2lines(options, stats)
+
+def _lineHashes(data):
+    # 64 bit hash of every (n, 4) line, +0. makes -0. and 0. the same key
+    bits = np.ascontiguousarray(data + 0.).view(np.uint64)
+    result = np.zeros(len(data), dtype=np.uint64)
+    for i in range(bits.shape[1]):
+        result = (result ^ bits[:, i]) * _HASH_MULTIPLIER
+        result ^= result >> np.uint64(29)
+    return result
 
+def svgPath2LinesIter(raw, options, stats=None):
+    # Yields the lines of svgPath2LinesWithOptions as lineBuffer chunks, each
+    # converted from a range of groups, so only one range is flattened at once
+    # Removing overlaps and fitting an arc count need all lines together, they
+    # are done in one chunk
+    # Besides the parsed commands and one chunk, memory grows by 8 bytes per
+    # line for the deduplication across chunks
+    buffer = commandBuffer.fromRaw(raw)
+    if options.removeOverlaps or options.maxArcCount > 0:
+        yield svgGroups(buffer).svg2lines(options, stats)
+        return
+
+    if stats is not None:
+        stats['arcCount'] = 0
+        stats['maxError'] = 0.
+        stats['simplifyTolerance'] = options.simplifyTolerance
+    # Hashes of the lines written by earlier chunks, sorted, 8 bytes per line
+    # A hash collision would drop a line, about n^2 / 2^65 for n lines
+    seen = np.empty(0, dtype=np.uint64)
+    for start, end in buffer.chunks(_STREAM_CHUNK_COMMANDS):
+        chunkStats = None if stats is None else {}
+        lines = svgGroups(buffer.slice(start, end)).svg2lines(options, chunkStats)
+        lines.sources += start
+        keys = _lineHashes(lines.data)
+        isNew = np.ones(len(keys), dtype=np.bool_)
+        if len(seen) > 0:
+            found = np.minimum(np.searchsorted(seen, keys), len(seen) - 1)
+            isNew = seen[found] != keys
+        lines = lines[isNew]
+        newKeys = np.unique(keys[isNew])
+        seen = np.insert(seen, np.searchsorted(seen, newKeys), newKeys)
+        if stats is not None:
+            stats['arcCount'] += len(lines)
+            stats['maxError'] = max(stats['maxError'], chunkStats['maxError'])
+        yield lines
+
+
+def _affLineTime(line, lastTime):
+    match = _AFF_TIME_RE.match(line)
+    return int(match.group(1)) if match else lastTime
+
+def _affChartEntries(f):
+    # Yields (time, line) of every chart line with its line ending, lines
+    # without a time and the whole timinggroup blocks keep the time of the line
+    # before them
+    time = float('-inf')
+    depth = 0
+    for line in f:
+        if depth == 0:
+            time = _affLineTime(line, time)
+        depth += line.count('{') - line.count('}')
+        yield time, line
+
+def spliceArcsIntoAff(chartPath, arcs, wrapTimingGroup=False, outputPath=None):
+    # Merges arc lines (e.g. from svgPath2AffIter) into an aff chart by time
+    # and returns the number of arcs added, arcs already in the chart are
+    # skipped. With wrapTimingGroup the arcs go into a new timinggroup at the
+    # end that uses the first timing of the chart
+    # The chart is streamed twice, once for an index of its arcs and once for
+    # the merge, the result is written to a temporary file which then replaces
+    # outputPath (chartPath by default)
+    existing = set()
+    firstTiming = None
+    # Added lines use the line ending of the chart
+    newline = None
+    with open(chartPath, 'r', encoding='utf-8', newline='') as f:
+        for line in f:
+            if newline is None and line.endswith(('\r\n', '\n', '\r')):
+                newline = line[len(line.rstrip('\r\n')):]
+            line = line.strip()
+            if line.startswith('arc('):
+                # Only the hashes are kept, a collision would just skip an arc
+                existing.add(hash(line))
+            elif firstTiming is None and line.startswith('timing('):
+                firstTiming = line
+    if wrapTimingGroup and firstTiming is None:
+        raise ValueError('no timing in chart')
+
+    added = []
+    for arc in arcs:
+        arc = arc.strip()
+        if arc and hash(arc) not in existing:
+            existing.add(hash(arc))
+            added.append((_affLineTime(arc, 0), arc + (newline or '\n')))
+    # Only the new arcs are sorted, the chart is expected in time order
+    added.sort(key=lambda entry: entry[0])
+
+    newline = newline or '\n'
+    outputPath = chartPath if outputPath is None else outputPath
+    fd, tempPath = tempfile.mkstemp(
+        suffix='.aff',
+        dir=os.path.dirname(os.path.abspath(outputPath))
+    )
+    try:
+        with open(fd, 'w', encoding='utf-8', newline='') as dst, \
+                open(chartPath, 'r', encoding='utf-8', newline='') as src:
+            lastEnded = True
+
+            def write(line):
+                # Only the last chart line can miss its line ending
+                nonlocal lastEnded
+                if not lastEnded:
+                    dst.write(newline)
+                dst.write(line)
+                lastEnded = line.endswith(('\n', '\r'))
+
+            entries = _affChartEntries(src)
+            if wrapTimingGroup:
+                for _, line in entries:
+                    write(line)
+                if added:
+                    write('timinggroup(){' + newline)
+                    write('  ' + firstTiming + newline)
+                    for _, arc in added:
+                        write('  ' + arc)
+                    write('};' + newline)
+            else:
+                # Ties keep the chart lines first
+                for _, line in heapq.merge(entries, added, key=lambda entry: entry[0]):
+                    write(line)
+        # mkstemp creates the file readable by the owner only
+        shutil.copymode(chartPath, tempPath)
+        os.replace(tempPath, outputPath)
+    except BaseException:
+        os.remove(tempPath)
+        raise
+    return len(added)
 
 def __main(*args):
     (
@@ -893,9 +1563,6 @@ def __main(*args):
 
 
 if __name__ == '__main__':
-    # 使用时请到 https://yqnn.github.io/svg-path-editor/ 格式化一下 (请不要使用 Minify output 输出) ，因为这个解析器对格式比较严格
-    # Please format it at https://yqnn.github.io/svg-path-editor/ (do not use the 'Minify output' output), as this parser is very strict about formatting. (deepl)
-
     # scaleFirst
     # True: p * scale + offset
     # False: (p + offset) * scale